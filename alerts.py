@@ -0,0 +1,210 @@
+# alerts.py - declarative alert rules evaluated incrementally on every snapshot, with dedupe + cooldown
+import os, re, json, time
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# one rule per line (or ";"-separated in ALERT_RULES):
+#   <field> <op> <number|field> [: label]      level rule, fires when it becomes true
+#   cross_up|cross_down <field> <field> [: label]   fires on the snapshot where a crosses b
+# fields: any Quote field (price, pct, vol_ratio, sma20, sma50, gap, rsi14, ...) and,
+# for the market row, foreign_net (foreign buy - sell), index_pct and, from the
+# flows.py store, foreign_net_20d and breadth (share of advancers, 0..1)
+DEFAULT_RULES = """
+pct >= 5: tăng mạnh
+pct <= -5: giảm mạnh
+cross_up price sma20: vượt SMA20
+cross_down price sma20: thủng SMA20
+cross_up price sma50: vượt SMA50
+cross_down price sma50: thủng SMA50
+vol_ratio >= 2: khối lượng đột biến
+gap >= 3: gap tăng
+gap <= -3: gap giảm
+foreign_net >= 100: khối ngoại mua ròng mạnh
+foreign_net <= -100: khối ngoại bán ròng mạnh
+"""
+ALERT_RULES = os.getenv("ALERT_RULES", "").strip()
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE", "").strip()
+# seconds before the same rule may fire again for the same symbol
+ALERT_COOLDOWN = float(os.getenv("ALERT_COOLDOWN", "3600") or 3600)
+ALERT_STATE_FILE = os.getenv("ALERT_STATE_FILE", ".alerts.json")
+# row key of the market-wide values (foreign flow, index)
+MARKET_KEY = "VNINDEX"
+MARKET_FIELDS = ("foreign_net", "index_pct", "foreign_net_20d", "breadth")
+PCT_FIELDS = ("pct", "gap", "index_pct", "high52_dist", "low52_dist")
+
+_RE_LEVEL = re.compile(r"^(\w+)\s*(>=|<=|>|<)\s*(-?[\d.]+|\w+)$")
+_RE_CROSS = re.compile(r"^(cross_up|cross_down)\s+(\w+)\s+(\w+)$")
+_OPS = {">=": "greater_equal", "<=": "less_equal", ">": "greater", "<": "less"}
+
+class Rule:
+    """One compiled rule: its operands and a vectorized comparison over all rows."""
+    def __init__(self, text):
+        body, _, label = text.partition(":")
+        body = " ".join(body.split())
+        self.text = body
+        m = _RE_CROSS.match(body)
+        if m:
+            kind, self.a, self.b = m.groups()
+            self.cross = True
+            self.op = np.greater if kind == "cross_up" else np.less
+        else:
+            m = _RE_LEVEL.match(body)
+            if not m: raise ValueError(f"bad alert rule: {text!r}")
+            self.a, op, b = m.groups()
+            self.cross = False
+            self.op = getattr(np, _OPS[op])
+            try: self.b = float(b)
+            except ValueError: self.b = b
+        self.label = label.strip() or body
+        self.fields = {self.a} | ({self.b} if isinstance(self.b, str) else set())
+
+    def condition(self, cols):
+        """(cond, known): bool arrays; known is False where an operand is missing."""
+        a = cols[self.a]
+        b = cols[self.b] if isinstance(self.b, str) else self.b
+        known = ~np.isnan(a) & (~np.isnan(b) if isinstance(self.b, str) else True)
+        with np.errstate(invalid="ignore"):
+            return self.op(a, b) & known, known
+
+    def describe(self, key, cols, i):
+        a = cols[self.a][i]
+        if self.cross:
+            return f"  {key} {self.label} ({self.a} {a:,.2f} / {self.b} {cols[self.b][i]:,.2f})"
+        return f"  {key} {self.label} ({a:+.2f}%)" if self.a in PCT_FIELDS else f"  {key} {self.label} ({self.a}={a:,.2f})"
+
+def parse_rules(text):
+    return [Rule(line) for line in re.split(r"[;\n]", text) if line.strip() and not line.strip().startswith("#")]
+
+def load_rules():
+    if ALERT_RULES_FILE:
+        with open(ALERT_RULES_FILE, encoding="utf-8") as f:
+            return parse_rules(f.read())
+    return parse_rules(ALERT_RULES or DEFAULT_RULES)
+
+def _num(v):
+    return np.nan if v is None else v
+
+class AlertEngine:
+    """Rules x rows state kept as arrays: per rule the last condition of every
+    row (-1 unknown / 0 / 1) and when it last fired. Each snapshot costs one
+    vectorized comparison per rule and O(1) state updates per row; nothing is
+    recomputed from history.
+
+    A level rule fires when its condition turns true (not again while it stays
+    true); a cross rule fires when it turns true after having been seen false.
+    Either way it stays silent for `cooldown` seconds after firing.
+    """
+    def __init__(self, rules, cooldown=ALERT_COOLDOWN):
+        self.rules = list(rules)
+        self.cooldown = cooldown
+        self.fields = set().union(*(r.fields for r in self.rules)) if self.rules else set()
+        self.keys = []
+        self.prev = np.zeros((len(self.rules), 0), np.int8)
+        self.last = np.zeros((len(self.rules), 0))
+
+    def _reindex(self, keys):
+        if keys == self.keys: return
+        pos = {k: i for i, k in enumerate(self.keys)}
+        idx = np.array([pos.get(k, -1) for k in keys], dtype=np.intp)
+        known = idx >= 0
+        idx = np.where(known, idx, 0)
+        if self.keys:
+            self.prev = np.where(known, self.prev[:, idx], -1).astype(np.int8)
+            self.last = np.where(known, self.last[:, idx], -np.inf)
+        else:
+            self.prev = np.full((len(self.rules), len(keys)), -1, np.int8)
+            self.last = np.full((len(self.rules), len(keys)), -np.inf)
+        self.keys = list(keys)
+
+    def columns(self, symbols, quote, market=None):
+        """{field: array over symbols + [MARKET_KEY]} for the fields the rules use."""
+        qs = [quote(s) for s in symbols] + [None]
+        cols = {}
+        for f in self.fields:
+            if f in MARKET_FIELDS: continue
+            cols[f] = np.array([_num(getattr(q, f, None)) for q in qs], dtype=float)
+        fb, fs = (market or {}).get("foreign_buy"), (market or {}).get("foreign_sell")
+        extra = {"foreign_net": fb - fs if fb is not None and fs is not None else None,
+                 "index_pct": (market or {}).get("pct"),
+                 "foreign_net_20d": (market or {}).get("foreign_net_20d"),
+                 "breadth": (market or {}).get("breadth")}
+        for f in MARKET_FIELDS:
+            if f in self.fields:
+                col = np.full(len(qs), np.nan)
+                if extra[f] is not None: col[-1] = float(extra[f])
+                cols[f] = col
+        return cols
+
+    def evaluate(self, symbols, quote, market=None, now=None):
+        """Alert lines fired by this snapshot, in symbol order then rule order.
+        quote(symbol) returns its Quote or None; market is the normalized market record."""
+        return [line for _, _, line in self.fire(symbols, quote, market, now)]
+
+    def fire(self, symbols, quote, market=None, now=None):
+        """(row key, rule index, alert line) of every alert fired by this snapshot,
+        in the order of evaluate()."""
+        now = time.time() if now is None else now
+        keys = list(symbols) + [MARKET_KEY]
+        self._reindex(keys)
+        cols = self.columns(symbols, quote, market)
+        fired = []
+        for r, rule in enumerate(self.rules):
+            cond, known = rule.condition(cols)
+            prev = self.prev[r]
+            edge = cond & ((prev == 0) if rule.cross else (prev != 1))
+            edge &= now - self.last[r] >= self.cooldown
+            self.last[r][edge] = now
+            # a missing value keeps the previous state instead of resetting it
+            self.prev[r] = np.where(known, cond, prev)
+            fired.extend((i, r) for i in np.flatnonzero(edge).tolist())
+        fired.sort()
+        return [(keys[i], r, self.rules[r].describe(keys[i], cols, i)) for i, r in fired]
+
+    def active(self):
+        """Bitmask per row of the last snapshot (its symbols, then MARKET_KEY) of
+        the rules whose condition holds; rule r is bit r % 63."""
+        mask = np.zeros(len(self.keys), np.int64)
+        for r in range(len(self.rules)):
+            mask |= np.where(self.prev[r] == 1, np.int64(1) << np.int64(r % 63), np.int64(0))
+        return mask
+
+    def to_json(self):
+        return {"rules": [r.text for r in self.rules], "keys": self.keys,
+                "prev": self.prev.tolist(), "last": np.where(np.isinf(self.last), None, self.last).tolist()}
+
+    def load_state(self, d):
+        """Restore state saved by to_json; rows of rules that changed start fresh."""
+        keys = d.get("keys") or []
+        saved = {t: (p, l) for t, p, l in zip(d.get("rules", []), d.get("prev", []), d.get("last", []))}
+        self.keys = list(keys)
+        self.prev = np.full((len(self.rules), len(keys)), -1, np.int8)
+        self.last = np.full((len(self.rules), len(keys)), -np.inf)
+        for r, rule in enumerate(self.rules):
+            if rule.text in saved:
+                p, l = saved[rule.text]
+                self.prev[r] = p
+                self.last[r] = [-np.inf if x is None else x for x in l]
+
+_engine = None
+
+def engine(path=None):
+    """The process-wide engine, with its state restored from ALERT_STATE_FILE."""
+    global _engine
+    if _engine is None:
+        _engine = AlertEngine(load_rules())
+        try:
+            with open(path or ALERT_STATE_FILE, encoding="utf-8") as f:
+                _engine.load_state(json.load(f))
+        except (OSError, ValueError, KeyError):
+            pass
+    return _engine
+
+def save(path=None):
+    if _engine is None: return
+    path = path or ALERT_STATE_FILE
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_engine.to_json(), f)
+    os.replace(tmp, path)
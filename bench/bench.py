@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# bench/bench.py - offline benchmark of the full report pipeline, replaying local fixtures
+#
+# The committed fixtures are synthetic: generated daily bars, hand-written VietStock /
+# CafeF pages shaped like the live ones (filler rows S000..., a <script> / <style> trap
+# for the tag stripper) and a minimal sendMessage reply. --record replaces them with
+# real captures.
+#
+#   python bench/bench.py                         # sizes 6,100,1600 -> bench/results.json
+#   python bench/bench.py --sizes 6,100 --out /tmp/new.json --compare bench/results.json
+#   python bench/bench.py --record                # refresh fixtures from the live sources
+import os, sys, json, time, argparse, tempfile, platform, tracemalloc
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "bench", "fixtures")
+sys.path.insert(0, ROOT)
+
+# fixed environment for every run: temp history store, scrapers on, vnstock off
+os.environ["HISTORY_DIR"] = tempfile.mkdtemp(prefix="bench-history-")
+os.environ["FLOW_DIR"] = tempfile.mkdtemp(prefix="bench-flows-")
+os.environ["ALERT_STATE_FILE"] = os.path.join(os.environ["FLOW_DIR"], "alerts.json")
+os.environ["USE_SCRAPERS"] = "1"
+os.environ["USE_VNSTOCK"] = "0"
+os.environ.pop("CACHE_DB", None)
+
+import pandas as pd
+
+YF_TEMPLATES = ("HPG.VN", "MBB.VN", "SSI.VN")
+COUNTS = Counter()   # fake upstream requests per source
+
+def _fixture(name):
+    return os.path.join(FIXTURES, name)
+
+def _load_yf(ticker):
+    return pd.read_csv(_fixture(f"yf_{ticker.replace('^', '_')}.csv"), index_col="Date", parse_dates=True)
+
+# ---- replay fakes -------------------------------------------------------------
+
+class FakeYF:
+    """yf.download replay: symbol i gets template i % 3 scaled a little so rows differ."""
+    def __init__(self):
+        self.templates = [_load_yf(t) for t in YF_TEMPLATES]
+        self.index = _load_yf("^VNINDEX")
+
+    def frame(self, ticker):
+        if ticker == "^VNINDEX": return self.index
+        n = sum(map(ord, ticker))
+        return self.templates[n % len(self.templates)] * (1 + (n % 97) / 1000)
+
+    def download(self, tickers, period=None, start=None, **kw):
+        COUNTS["yfinance"] += 1
+        parts = {}
+        for t in tickers:
+            f = self.frame(t)
+            parts[t] = f[f.index >= pd.Timestamp(start)] if start else f
+        return pd.concat(parts, axis=1)
+
+class FakeResponse:
+    def __init__(self, body, status=200, headers=None):
+        self.body, self.status_code = body, status
+        self.headers = headers or {}
+        self.encoding = "utf-8"
+        self.text = body.decode("utf-8")
+
+    def iter_content(self, size):
+        for i in range(0, len(self.body), size):
+            yield self.body[i:i+size]
+
+    def json(self):
+        return json.loads(self.text)
+
+    def __enter__(self): return self
+    def __exit__(self, *a): return False
+
+class FakeSession:
+    """Serves scraper HTML and Bot API responses from fixtures."""
+    def __init__(self):
+        self.pages = {
+            "vietstock": open(_fixture("vietstock.html"), "rb").read(),
+            "cafef": open(_fixture("cafef.html"), "rb").read(),
+        }
+        self.telegram = open(_fixture("telegram_sendMessage.json"), "rb").read()
+        self.bytes = 0
+
+    def get(self, url, **kw):
+        src = "vietstock" if "vietstock" in url else "cafef"
+        COUNTS[src] += 1
+        self.bytes += len(self.pages[src])
+        return FakeResponse(self.pages[src])
+
+    def post(self, url, **kw):
+        COUNTS["telegram"] += 1
+        return FakeResponse(self.telegram)
+
+# ---- stage timing ---------------------------------------------------------------
+
+STAGES = Counter()
+
+def timed(stage, fn):
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            STAGES[stage] += time.perf_counter() - t0
+    return wrapper
+
+def install():
+    import bot, indicators, history_store, delivery, normalizers, cache
+    from sources import scrapers
+    bot.yf = FakeYF()
+    session = FakeSession()
+    scrapers.SESSION = session
+    delivery.get_session = lambda: session
+    # no rate-limit sleeps: we measure our own work, not Telegram's limits
+    delivery._global_limiter.acquire = lambda: None
+    delivery.chat_limiter = lambda chat_id: None
+    bot.dbg = lambda *a, **k: None
+    bot.BOT_TOKEN, bot.CHAT_IDS = "bench", ["-1001234567890"]
+    bot.fetch_market = timed("fetch_market", bot.fetch_market)
+    history_store.sync_history = timed("history_sync", history_store.sync_history)
+    indicators.symbol_infos = timed("indicators", indicators.symbol_infos)
+    bot.send_to_telegram = timed("send_to_telegram", bot.send_to_telegram)
+    return bot, cache, normalizers, session
+
+def one_run(bot, cache, symbols):
+    cache.CACHE.clear()
+    STAGES.clear(); COUNTS.clear()
+    t0 = time.perf_counter()
+    report = bot.collect_report(symbols)
+    text = bot.render.render(report)
+    t_report = time.perf_counter() - t0
+    bot.send_to_telegram(report)
+    total = time.perf_counter() - t0
+    stages = dict(STAGES)
+    stages["render"] = t_report - stages.get("fetch_market", 0.0)
+    return {
+        "total_s": round(total, 4),
+        "report_s": round(t_report, 4),
+        "stages_s": {k: round(v, 4) for k, v in sorted(stages.items())},
+        "requests": dict(COUNTS),
+        "report_chars": len(text),
+    }
+
+def bench_normalizer(normalizers, n):
+    rec = {"ticker": "HPG", "last": 26500.0, "changePercent": 1.2, "volume": 25_000_000, "avg5": 26300.0, "avgvol20": 21_000_000}
+    t0 = time.perf_counter()
+    for _ in range(n):
+        normalizers.normalize_symbol_record(rec, "bench")
+    return round((time.perf_counter() - t0) / n * 1e6, 3)
+
+def run(sizes, repeat):
+    bot, cache, normalizers, session = install()
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": repeat}, "sizes": {}}
+    for n in sizes:
+        symbols = [f"S{i:04d}" for i in range(n)] if n > 6 else ["MBB", "HPG", "SSI", "PVP", "KSB", "QTP"][:n]
+        # cold: empty history store (full backfill); warm: store filled, only deltas
+        os.environ["HISTORY_DIR"] = tempfile.mkdtemp(prefix=f"bench-{n}-")
+        import history_store
+        history_store.HISTORY_DIR = os.environ["HISTORY_DIR"]
+        cold = one_run(bot, cache, symbols)
+        warm = [one_run(bot, cache, symbols) for _ in range(repeat)]
+        best = min(warm, key=lambda r: r["total_s"])
+        tracemalloc.start()
+        one_run(bot, cache, symbols)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["sizes"][str(n)] = {
+            "cold": cold,
+            "warm": best,
+            "warm_median_s": sorted(r["total_s"] for r in warm)[len(warm) // 2],
+            "peak_mem_mb": round(peak / 2**20, 2),
+        }
+        print(f"{n:>5} symbols: cold {cold['total_s']:.3f}s  warm {best['total_s']:.3f}s  "
+              f"peak {peak / 2**20:.1f} MB  requests {best['requests']}", flush=True)
+    results["normalize_symbol_record_us"] = bench_normalizer(normalizers, 20000)
+    return results
+
+def compare(new, old_path, threshold):
+    """Print per-size warm latency changes; return True if any got slower than threshold."""
+    with open(old_path) as f:
+        old = json.load(f)
+    bad = False
+    for n, cur in new["sizes"].items():
+        prev = old.get("sizes", {}).get(n)
+        if not prev: continue
+        a, b = prev["warm"]["total_s"], cur["warm"]["total_s"]
+        change = (b / a - 1) * 100 if a else 0.0
+        reqs = (prev["warm"]["requests"], cur["warm"]["requests"])
+        flag = "REGRESSION" if change > threshold or reqs[1] != reqs[0] else "ok"
+        bad |= flag != "ok"
+        print(f"{n:>5}: {a:.3f}s -> {b:.3f}s ({change:+.1f}%)  requests {reqs[0]} -> {reqs[1]}  {flag}")
+    return bad
+
+def record():
+    """Refresh the fixtures from the live sources (needs network)."""
+    import yfinance as yf
+    import requests
+    for t in YF_TEMPLATES + ("^VNINDEX",):
+        hist = yf.Ticker(t).history(period="1y", auto_adjust=False)
+        hist.index = hist.index.tz_localize(None).date
+        hist.index.name = "Date"
+        hist[["Open", "High", "Low", "Close", "Volume"]].to_csv(_fixture(f"yf_{t.replace('^', '_')}.csv"), float_format="%.2f")
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; Bot/1.0)"}
+    for name, url in (("vietstock", "https://finance.vietstock.vn/ket-qua-giao-dich"), ("cafef", "https://cafef.vn/du-lieu.chn")):
+        r = requests.get(url, headers=headers, timeout=20)
+        with open(_fixture(f"{name}.html"), "wb") as f:
+            f.write(r.content)
+    print("fixtures updated in", FIXTURES)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="offline report pipeline benchmark")
+    ap.add_argument("--sizes", default="6,100,1600", help="watchlist sizes (default %(default)s)")
+    ap.add_argument("--repeat", type=int, default=3, help="warm runs per size, best is kept (default %(default)s)")
+    ap.add_argument("--out", default=os.path.join(ROOT, "bench", "results.json"))
+    ap.add_argument("--compare", help="previous results JSON; exit 1 on a regression")
+    ap.add_argument("--threshold", type=float, default=20.0, help="allowed warm latency increase in %% (default %(default)s)")
+    ap.add_argument("--record", action="store_true", help="re-record fixtures from the live sources and exit")
+    args = ap.parse_args(argv)
+    if args.record:
+        record(); return 0
+    results = run([int(s) for s in args.sizes.split(",") if s.strip()], max(1, args.repeat))
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print("results written to", args.out)
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,229 +1,577 @@
 #!/usr/bin/env python3
-<<<<<<< HEAD
 # bot.py - stock reporter (uses yfinance) with VN timezone-aware timestamps and clean formatting
-import os, traceback
-from datetime import datetime, timedelta
-try:
-    from zoneinfo import ZoneInfo
-except Exception:
-    ZoneInfo = None
-=======
-# bot.py - single-file robust bot (fixed quotes)
-import os, traceback
-from datetime import datetime
->>>>>>> parent of 6f7af73 (trước chạy được, cấu hình lại timezone)
-import requests
-
-try:
-    import yfinance as yf
-    import pandas as pd
-    import numpy as np
-except Exception:
-    yf = None
-    pd = None
-    np = None
-
-try:
-    from bs4 import BeautifulSoup
-except Exception:
-    BeautifulSoup = None
-
-<<<<<<< HEAD
-# symbols to report (CSV string or env SECRET)
-SYMBOLS = [s.strip().upper() for s in os.getenv("SYMBOLS", "MBB,HPG,SSI,PVP,KSB,QTP").split(",") if s.strip()]
+import os, sys, time, argparse, traceback
 
-def now_vn_str():
-    if ZoneInfo is not None:
-        now = datetime.now(ZoneInfo("Asia/Ho_Chi_Minh"))
-    else:
-        # fallback: assume system tz is UTC and add 7 hours
-        now = datetime.utcnow() + timedelta(hours=7)
-    return now.strftime("%Y-%m-%d %H:%M:%S")
-=======
-try:
-    import vnstock as vnstock_mod
-except Exception:
-    try:
-        import vnstock3 as vnstock_mod
-    except Exception:
-        vnstock_mod = None
+import functools
+import lazy
+import metrics
+import cache
+from run_context import RunContext
+import delivery
+import scheduler
+import fetch_engine
+import render
+import httpclient
+from normalizers import normalize_market_record, normalize_symbol_record
+from router import ROUTER
+from sources import vnstock_api
+
+# heavy libraries load on first use, so a run only pays for the sources it enables
+yf = lazy.module("yfinance")
+pd = lazy.module("pandas")
+history_store = lazy.module("history_store")
+indicators = lazy.module("indicators")
+scrapers = lazy.module("sources.scrapers")
+snapshot = lazy.module("snapshot")
+alerts = lazy.module("alerts")
+shards = lazy.module("shards")
+flows = lazy.module("flows")
 
 BOT_TOKEN = os.getenv('BOT_TOKEN','').strip()
 CHAT_ID = os.getenv('CHAT_ID','').strip()
-SYMBOLS = os.getenv('SYMBOLS','MBB,HPG,SSI,PVP,KSB,QTP').split(',')
+# comma-separated: the same report is fanned out to every chat
+CHAT_IDS = [c.strip() for c in CHAT_ID.split(",") if c.strip()]
+# symbols to report (CSV string or env SECRET)
+SYMBOLS = [s.strip().upper() for s in os.getenv("SYMBOLS", "MBB,HPG,SSI,PVP,KSB,QTP").split(",") if s.strip()]
+# whole-market universes: a file with symbols separated by commas or newlines replaces SYMBOLS
+SYMBOLS_FILE = os.getenv("SYMBOLS_FILE", "").strip()
+if SYMBOLS_FILE:
+    with open(SYMBOLS_FILE, encoding="utf-8") as _f:
+        SYMBOLS = list(dict.fromkeys(s.strip().upper() for s in _f.read().replace("\n", ",").split(",") if s.strip()))
+# watchlists at least this long get a top movers section
+TOP_MOVERS_MIN = int(os.getenv("TOP_MOVERS_MIN", "20") or 20)
+TOP_MOVERS = 5
+
+INDEX_TICKER = "^VNINDEX"
+# tickers per bulk yf.download request (one HTTP round trip per chunk)
+YF_BATCH_SIZE = int(os.getenv("YF_BATCH_SIZE", "200") or 200)
+# one period covers both the per-symbol indicators (SMA50 needs ~50 bars) and the index
+YF_PERIOD = os.getenv("YF_PERIOD", "120d")
+# keep daily bars on disk between runs and only download the newest ones
+USE_HISTORY = os.getenv("USE_HISTORY", "1") == "1"
+# market-wide sources (index fallback + foreign flow)
+USE_SCRAPERS = os.getenv("USE_SCRAPERS", "1") == "1"
+USE_VNSTOCK = os.getenv("USE_VNSTOCK", "0") == "1"
+# intraday delta mode: after the day's first full report only changed symbols are
+# reported, in one message per chat that is edited in place (thresholds in snapshot.py)
+DELTA_MODE = os.getenv("DELTA_MODE", "0") == "1"
+# keep market totals, foreign flow and breadth in the local time-series store (flows.py)
+USE_FLOWS = os.getenv("USE_FLOWS", "1") == "1"
+# per-chat report variants, "chat=format[:layout]" comma-separated (formats: text, html,
+# markdown; layouts: full, brief); other chats get text/full. Each variant is rendered once.
+CHAT_FORMATS = os.getenv("CHAT_FORMATS", "").strip()
+# also write the details table as CSV to this path on every run
+REPORT_CSV = os.getenv("REPORT_CSV", "").strip()
+# seconds between reports in --daemon mode
+DAEMON_INTERVAL = int(os.getenv("DAEMON_INTERVAL", "300") or 300)
+
+def now_vn_str():
+    return scheduler.vn_now().strftime("%Y-%m-%d %H:%M:%S")
 
 def dbg(msg):
     try: print("[DEBUG]", msg, flush=True)
     except: pass
->>>>>>> parent of 6f7af73 (trước chạy được, cấu hình lại timezone)
 
-def fm_money_million(v):
-    try: return f"{v/1_000_000:,.0f} Mn" if v is not None else "—"
-    except: return str(v)
+def yf_ticker(symbol):
+    return symbol if symbol.startswith("^") or symbol.endswith(".VN") else f"{symbol}.VN"
+
+def yf_split_frames(df, tickers):
+    """Split a yf.download result into {ticker: OHLCV DataFrame}, dropping empty ones."""
+    frames = {}
+    if df is None or df.empty:
+        return frames
+    if isinstance(df.columns, pd.MultiIndex):
+        present = set(df.columns.get_level_values(0))
+        for t in tickers:
+            if t not in present: continue
+            hist = df[t].dropna(how='all')
+            if not hist.empty: frames[t] = hist
+    elif len(tickers) == 1:
+        # older yfinance returns flat columns for a single ticker
+        hist = df.dropna(how='all')
+        if not hist.empty: frames[tickers[0]] = hist
+    return frames
+
+# tickers that came back without bars while the rest of their chunk did (delisted,
+# suspended): kept in cache.CACHE (shared between runs through CACHE_DB) and not
+# re-requested on their own for a day
+YF_NO_DATA_TTL = 24 * 3600
 
-def fm_shares_million(v):
-    try: return f"{v/1_000_000:,.2f} Mn" if v is not None else "—"
-    except: return str(v)
+class IncompleteDownload(Exception):
+    """yf.download returned no bars at all for a chunk. yfinance only logs
+    "Failed download" in that case, so this is raised to let the HTTP client
+    retry, back off and count the failure against the yfinance breaker."""
 
-def fm_pct(x):
-    try: return f"{x:+.2f}%" if x is not None else "—"
-    except: return str(x)
+def _yf_fetch(tickers, window, ctx=None):
+    if ctx is not None: ctx.count_request("yfinance")
+    df = yf.download(tickers, group_by='ticker', auto_adjust=False, threads=True, progress=False, **window)
+    return yf_split_frames(df, tickers)
 
-def yf_get_symbol(symbol):
-    if yf is None: return None
+def yf_no_data(ticker):
+    return cache.CACHE.get(("yf-no-data", ticker)) is not None
+
+def yf_download_chunk(chunk, window, ctx=None):
+    """{ticker: frame} for one bulk request. Only a chunk that returned no bars
+    at all counts as a failed yfinance call; when some bars arrived the tickers
+    still missing are re-requested once outside the breaker, and those that
+    come back empty again are not re-requested for YF_NO_DATA_TTL."""
+    def attempt():
+        got = _yf_fetch(chunk, window, ctx)
+        if not got and not all(yf_no_data(t) for t in chunk):
+            raise IncompleteDownload(f"no bars for any of {len(chunk)} tickers")
+        return got
     try:
-        tk = yf.Ticker(f"{symbol}.VN")
-        hist = tk.history(period='60d')
-        if hist.empty: return None
-        close = hist['Close'].astype(float).dropna()
-        last = float(close.iloc[-1])
-<<<<<<< HEAD
-        prev = float(close.iloc[-2]) if len(close) >= 2 else last
-        pct = (last/prev - 1) * 100 if prev != 0 else 0.0
-        vol = int(hist['Volume'].astype(float).iloc[-1]) if 'Volume' in hist and len(hist['Volume'].dropna())>0 else None
-        avg5_price = float(close.tail(5).mean()) if len(close) >= 5 else None
-        avgvol20 = int(hist['Volume'].astype(float).tail(20).mean()) if 'Volume' in hist and len(hist['Volume'].dropna())>=20 else None
-        return {"source":"yfinance","symbol":sym,"price": last,"pct": pct,"vol": vol,"avg5_price": avg5_price,"avg5_vol": avgvol20}
+        got = httpclient.CLIENT.call("yfinance", attempt)
     except Exception as e:
-        print("fetch_symbol_yf error", sym, e)
-        return None
-=======
-        prev = float(close.iloc[-2]) if len(close)>=2 else last
-        pct = (last/prev - 1) * 100 if prev else 0
-        vol = int(hist['Volume'].iloc[-1]) if 'Volume' in hist else None
-        avg5 = float(close.tail(5).mean()) if len(close)>=5 else None
-        avgvol20 = int(hist['Volume'].tail(20).mean()) if 'Volume' in hist else None
-        sma20 = float(close.rolling(20).mean().iloc[-1]) if len(close)>=20 else None
-        sma50 = float(close.rolling(50).mean().iloc[-1]) if len(close)>=50 else None
-        return {"symbol":symbol,"price":last,"pct":pct,"vol":vol,"avg5_price":avg5,"avg5_vol":avgvol20,"sma20":sma20,"sma50":sma50}
+        metrics.inc("failures", "yfinance")
+        dbg(f"yf.download error ({len(chunk)} tickers): {e}")
+        return {}
+    missing = [t for t in chunk if t not in got and not yf_no_data(t)]
+    if got and missing:
+        try:
+            got.update(_yf_fetch(missing, window, ctx))
+        except Exception as e:
+            dbg(f"yf.download retry error ({len(missing)} tickers): {e}")
+        dead = [t for t in missing if t not in got]
+        for t in dead:
+            cache.CACHE.set(("yf-no-data", t), True, ttl=YF_NO_DATA_TTL)
+        if dead: dbg(f"yf.download: no bars for {len(dead)}/{len(chunk)} tickers: {', '.join(dead[:5])}")
+    return got
+
+def yf_download_batch(tickers, period=YF_PERIOD, start=None, ctx=None):
+    """Fetch history for many tickers in as few bulk requests as possible.
+
+    With start (YYYY-MM-DD) only bars from that day on are requested. Each
+    yf.download call is counted on ctx (a RunContext) when given."""
+    if not tickers or not yf: return {}
+    window = {"start": start} if start else {"period": period or YF_PERIOD}
+    frames = {}
+    for i in range(0, len(tickers), YF_BATCH_SIZE):
+        frames.update(yf_download_chunk(tickers[i:i+YF_BATCH_SIZE], window, ctx))
+    return frames
+
+def hist_index_info(hist, source="yfinance"):
+    if hist is None or hist.empty: return None
+    close = hist['Close'].astype(float).dropna()
+    if close.empty: return None
+    last = float(close.iloc[-1])
+    prev = float(close.iloc[-2]) if len(close) >= 2 else last
+    pct = (last/prev - 1) * 100 if prev else 0
+    return {"source":source,"price":last,"pct":pct}
+
+@metrics.timed("yfinance")
+def fetch_yf_chunk(symbols, ctx, index=False):
+    """Index (optional) + symbols from one batched download (deltas only when the
+    on-disk history store is enabled). Returns (index_info, {symbol: info}).
+    """
+    tickers = [yf_ticker(s) for s in symbols] + ([INDEX_TICKER] if index else [])
+    download = functools.partial(yf_download_batch, ctx=ctx)
+    frames = None
+    if USE_HISTORY and history_store and history_store.np is not None:
+        try:
+            frames = history_store.sync_history(tickers, download)
+        except Exception as e:
+            dbg("history store error, falling back to full download: "+str(e))
+    if frames is None:
+        frames = download(tickers)
+    try:
+        infos = indicators.symbol_infos(symbols, {s: frames[yf_ticker(s)] for s in symbols if yf_ticker(s) in frames})
     except Exception as e:
-        dbg(f"yf_get_symbol error {symbol}: {e}"); return None
->>>>>>> parent of 6f7af73 (trước chạy được, cấu hình lại timezone)
+        dbg(f"indicators error ({len(symbols)} symbols): {e}"); infos = {}
+    idx = None
+    if index:
+        try:
+            idx = hist_index_info(frames.get(INDEX_TICKER))
+        except Exception as e:
+            dbg("hist_index_info error: "+str(e))
+    return idx, infos
 
-def yf_get_index():
-    if yf is None: return None
+@metrics.timed("vnstock")
+def fetch_vnstock_chunk(symbols, ctx, index=False):
+    """Same shape as fetch_yf_chunk from vnstock daily history (one call per symbol)."""
+    frames = {}
+    for s in symbols + (["VNINDEX"] if index else []):
+        ctx.count_request("vnstock")
+        try:
+            hist = httpclient.CLIENT.call("vnstock", vnstock_api.fetch_history, s)
+        except httpclient.CircuitOpen as e:
+            dbg(f"vnstock history skipped for {len(symbols)} symbols: {e}"); break
+        except Exception as e:
+            dbg(f"vnstock history error {s}: {e}"); continue
+        if hist is not None and not hist.empty: frames[s] = hist
     try:
-        tk = yf.Ticker('^VNINDEX')
-        hist = tk.history(period='120d')
-        if hist.empty: return None
-        close = hist['Close'].astype(float).dropna()
-        last = float(close.iloc[-1])
-        prev = float(close.iloc[-2]) if len(close)>=2 else last
-        pct = (last/prev - 1) * 100 if prev else 0
-        return {"price":last,"pct":pct}
+        infos = indicators.symbol_infos(symbols, frames, source="vnstock")
     except Exception as e:
-        dbg("yf_get_index error: "+str(e)); return None
+        dbg(f"indicators error ({len(symbols)} symbols): {e}"); infos = {}
+    return (hist_index_info(frames.get("VNINDEX"), "vnstock") if index else None), infos
 
-def build_report(symbols):
-<<<<<<< HEAD
-    now = now_vn_str()
-    lines = []
-    lines.append(f"📊 Báo cáo thị trường — {now}")
-    # VN-Index attempt via yfinance
-    idx = fetch_index_yf()
+def symbol_sources():
+    """{source: chunk fetcher} the router may pick from for per-symbol data."""
+    sources = {"yfinance": fetch_yf_chunk}
+    if USE_VNSTOCK: sources["vnstock"] = fetch_vnstock_chunk
+    return sources
+
+def route_symbols(symbols, ctx, index=False):
+    """Per-symbol data (and the index) for one chunk from whichever source the
+    router ranks best, hedged with the next one when it is slow. Symbols the
+    winner has no data for are asked from the remaining sources. Results go
+    into ctx under ("symbol", symbol, YF_PERIOD) / ("index", INDEX_TICKER, YF_PERIOD).
+    """
+    sources = symbol_sources()
+    timeout = fetch_engine.SOURCE_TIMEOUTS.get("symbols", 40)
+    missing, need_index = list(symbols), index
+    while sources and (missing or need_index):
+        want, want_index = list(missing), need_index
+        ok = lambda r: bool(r) and (any(r[1].values()) or (want_index and bool(r[0])))
+        src, res = ROUTER.call({name: fetch_engine.limited(name, functools.partial(fn, want, ctx, index=want_index))
+                                for name, fn in sources.items()},
+                               ok=ok, timeout=timeout, log=dbg)
+        if src is None: break
+        idx, infos = res
+        for s in want:
+            if infos.get(s):
+                ctx.put("symbol", s, YF_PERIOD, normalize_symbol_record(infos[s], src))
+        if idx:
+            ctx.put("index", INDEX_TICKER, YF_PERIOD, idx); need_index = False
+        missing = [s for s in want if not infos.get(s)]
+        del sources[src]
+    for s in missing:
+        ctx.put("symbol", s, YF_PERIOD, None)
+    if need_index:
+        ctx.put("index", INDEX_TICKER, YF_PERIOD, None)
+
+def market_ok(rec):
+    return bool(rec) and not rec.get("error") and (rec.get("index") is not None or rec.get("fbuy") is not None)
+
+def route_market(ctx):
+    """Index + foreign totals from the best-ranked scraper (hedged with the other one),
+    stored in ctx as ("market", None, None)."""
+    timeouts = fetch_engine.SOURCE_TIMEOUTS
+    candidates = {}
+    for src, fn in (("vietstock", scrapers.scrape_vietstock_market), ("cafef", scrapers.scrape_cafef_market)):
+        candidates[src] = fetch_engine.limited(src, functools.partial(ctx.fetch, src, None, None, metrics.traced(fn.__name__, fn),
+                                                                      timeout=timeouts.get(src, 8)))
+    src, rec = ROUTER.call(candidates, ok=market_ok, timeout=timeouts.get("market", 12), log=dbg)
+    ctx.put("market", None, None, normalize_market_record(rec, src) if src else None)
+
+def market_jobs(symbols, ctx):
+    """fetch_engine jobs for every source call of a report that ctx does not hold yet."""
+    jobs = {}
+    missing = [s for s in symbols if not ctx.has("symbol", s, YF_PERIOD)]
+    need_index = not ctx.has("index", INDEX_TICKER, YF_PERIOD)
+    for i in range(0, len(missing), YF_BATCH_SIZE):
+        jobs[f"symbols:{i}"] = ("symbols", route_symbols, (missing[i:i+YF_BATCH_SIZE], ctx), {"index": need_index and i == 0})
+    if need_index and not missing:
+        jobs["symbols:index"] = ("symbols", route_symbols, ([], ctx), {"index": True})
+    if USE_SCRAPERS and scrapers and not ctx.has("market"):
+        jobs["market"] = ("market", route_market, (ctx,), {})
+    if USE_VNSTOCK and not ctx.has("vnstock"):
+        jobs["vnstock"] = ("vnstock", ctx.fetch, ("vnstock", None, None, metrics.traced("fetch_foreign", vnstock_api.fetch_foreign)), {})
+    return jobs
+
+# router stats survive between runs when the cache is shared (CACHE_DB)
+ROUTER_STATS_KEY = ("router-stats",)
+_router_loaded = False
+
+def seed_from_cache(keys, ctx):
+    """Put hot cache entries (earlier runs / other processes) for keys into ctx so
+    they skip the upstream call. Returns the set of keys served from the cache."""
+    cached = set()
+    for key in keys:
+        if ctx.has(*key): continue
+        hit = cache.CACHE.get(key)
+        if hit is not None:
+            ctx.put(*key, hit); cached.add(key)
+        metrics.inc("cache_hits" if hit is not None else "cache_misses", key[0])
+    return cached
+
+def store_to_cache(keys, ctx, cached):
+    """Write what ctx fetched for keys back to the cache (not the entries it was seeded with)."""
+    for key in keys:
+        if key in cached: continue
+        value = ctx.memo.get(key)
+        if value is not None and not (isinstance(value, dict) and value.get("error")):
+            cache.CACHE.set(key, value, kind=cache.SOURCE_KIND.get(key[0]))
+
+def fetch_symbols(symbols, ctx):
+    """Quotes for symbols only (no index or market data), cache first; read them
+    with ctx.get("symbol", symbol, YF_PERIOD)."""
+    keys = [("symbol", s, YF_PERIOD) for s in symbols]
+    cached = seed_from_cache(keys, ctx)
+    missing = [s for s in symbols if not ctx.has("symbol", s, YF_PERIOD)]
+    jobs = {f"symbols:{i}": ("symbols", route_symbols, (missing[i:i+YF_BATCH_SIZE], ctx), {})
+            for i in range(0, len(missing), YF_BATCH_SIZE)}
+    fetch_engine.run_jobs(jobs, log=dbg)
+    store_to_cache(keys, ctx, cached)
+
+@metrics.timed("fetch_market")
+def fetch_market(symbols, ctx):
+    """Fetch everything for a report concurrently, bounded by fetch_engine.RUN_DEADLINE,
+    into ctx. Symbols are then read with ctx.get("symbol", symbol, YF_PERIOD).
+
+    Returns (index_info, market) where market is a normalized market record
+    (index / foreign buy / sell) from the scraper the router picked, topped up
+    by vnstock, or None.
+    """
+    global _router_loaded
+    if not _router_loaded:
+        ROUTER.load(cache.CACHE.get(ROUTER_STATS_KEY)); _router_loaded = True
+    keys = [("symbol", s, YF_PERIOD) for s in symbols] + [("index", INDEX_TICKER, YF_PERIOD)]
+    keys += [(src, None, None) for src, on in (("market", USE_SCRAPERS), ("vnstock", USE_VNSTOCK)) if on]
+    cached = seed_from_cache(keys, ctx)
+    fetch_engine.run_jobs(market_jobs(symbols, ctx), log=dbg)
+    store_to_cache(keys, ctx, cached)
+    cache.CACHE.set(ROUTER_STATS_KEY, ROUTER.snapshot(), ttl=86400)
+    idx = ctx.get("index", INDEX_TICKER, YF_PERIOD)
+    market = ctx.get("market")
+    market = dict(market) if market else None
+    rec = ctx.get("vnstock")
+    if rec and not rec.get("error"):
+        norm = normalize_market_record(rec, "vnstock")
+        if market is None:
+            market = norm
+        else:
+            for k in ("price", "foreign_buy", "foreign_sell"):
+                if market.get(k) is None and norm.get(k) is not None: market[k] = norm[k]
+    if (not idx or idx.get("price") is None) and market and market.get("price"):
+        idx = {"source": market["source"], "price": market["price"], "pct": market.get("pct")}
+    return idx, market
+
+def symbol_line(s, q):
+    """One "🔻 Chi tiết mã" line for symbol s and its Quote q (None = no data)."""
+    return render.row(s, q)
+
+def record_flows(symbols, ctx, idx, market):
+    """Append this run to the flow store and return its rolling trends ({} when off)."""
+    if not USE_FLOWS or not flows or flows.np is None: return {}
+    rec = dict(market or {})
     if idx and idx.get("price") is not None:
-        lines.append(f"📈 VN-Index: {idx['price']:.2f} {fm_pct(idx.get('pct'))} (src={idx.get('source')})")
-    else:
-        lines.append("📈 VN-Index: — (lỗi dữ liệu)")
-=======
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    lines=[f"📊 Báo cáo thị trường — {now}"]
-    idx=yf_get_index()
-    if idx: lines.append(f"📈 VN-Index: {idx['price']:.2f} {fm_pct(idx.get('pct'))}")
-    else: lines.append("📈 VN-Index: — (lỗi dữ liệu)")
->>>>>>> parent of 6f7af73 (trước chạy được, cấu hình lại timezone)
-    lines.append("")
-
-    # Summary (simple counts)
+        rec["price"], rec["pct"] = idx["price"], idx.get("pct")
+    try:
+        fs = flows.store()
+        fs.record(symbols, lambda s: ctx.get("symbol", s, YF_PERIOD), rec)
+        trend = fs.trends()
+        buckets = fs.intraday()
+        if len(buckets) >= 2: trend["foreign_5m"] = buckets[-1][2]
+        return trend
+    except Exception as e:
+        dbg("flow store error: "+str(e)); return {}
+
+def top_movers(symbols, ctx, n=TOP_MOVERS):
+    """([(symbol, pct)] of the n biggest gainers, same for the losers)."""
+    moves = []
+    for s in symbols:
+        q = ctx.get("symbol", s, YF_PERIOD)
+        if q is not None and q.pct is not None: moves.append((q.pct, s))
+    moves.sort()
+    up = [(s, p) for p, s in reversed(moves[-n:]) if p > 0]
+    down = [(s, p) for p, s in moves[:n] if p < 0]
+    return up, down
+
+@metrics.timed("build_report")
+def collect_report(symbols, ctx=None, delta=None):
+    """Everything the report shows as a render.Report, fetched and computed once
+    for all its output formats. With delta (the previous snapshot.Snapshot) only
+    symbols that changed since then, or fired an alert, are listed; the next
+    snapshot and the number of listed symbols are left in ctx as ("delta", None, None).
+    The alert state per symbol is left as ("alert_state", None, None)."""
+    ctx = ctx if ctx is not None else RunContext()
+    now = now_vn_str()
+    idx, market = fetch_market(symbols, ctx)
+    trend = record_flows(symbols, ctx, idx, market)
+    try:
+        alert_market = dict(market or {}, foreign_net_20d=trend.get("foreign_net_20d"), breadth=trend.get("breadth"))
+        eng = alerts.engine()
+        hits = eng.fire(symbols, lambda s: ctx.get("symbol", s, YF_PERIOD), alert_market)
+        ctx.put("alert_state", None, None, eng.active()[:len(symbols)])
+    except Exception as e:
+        dbg("alert rules error: "+str(e)); hits = []
+    fired = [line for _, _, line in hits]
+    ctx.put("alerts", None, None, fired)
+    shown = delta_info = None
+    if delta is not None:
+        cur = snapshot.Snapshot.take(symbols, lambda s: ctx.get("symbol", s, YF_PERIOD), ctx.get("alert_state"))
+        alerted = {key for key, _, _ in hits}
+        changed = [c or s in alerted for s, c in zip(symbols, delta.changes(cur).tolist())]
+        shown = {s for s, c in zip(symbols, changed) if c}
+        ctx.put("delta", None, None, (delta.advance(cur, changed), len(shown)))
+        delta_info = (len(shown), len(symbols), delta.time)
+
+    # Summary (simple counts); quotes are read by attribute, no per-symbol dicts
     up = down = 0
-    details = []
+    rows = []
     for s in symbols:
-<<<<<<< HEAD
-        info = fetch_symbol_yf(s)
-        if not info or info.get("price") is None:
-            details.append(f"{s}: — (lỗi dữ liệu)")
+        q = ctx.get("symbol", s, YF_PERIOD)
+        if q is None or q.price is None:
+            if shown is None or s in shown: rows.append((s, None))
             continue
-        pct = info.get("pct")
+        pct = q.pct
         if pct is not None:
             if pct > 0: up += 1
             elif pct < 0: down += 1
-        vol = info.get("vol")
-        avgvol = info.get("avg5_vol")
-        vol_ratio = None
-        if vol and avgvol:
-            try:
-                vol_ratio = vol / avgvol if avgvol>0 else None
-            except Exception:
-                vol_ratio = None
-        vol_ratio_s = f" (VolRatio={vol_ratio:.2f}×)" if vol_ratio else ""
-        details.append(f"{s}: {int(info.get('price'))} {fm_pct(pct)} | KL={fm_shares_million(vol)}{vol_ratio_s} | TB tuần: {info.get('avg5_price') or '—'} / {fm_shares_million(avgvol)}")
-    lines.append(f"Summary: Tăng {up} / Giảm {down}")
-    lines.append("🔻 Chi tiết mã:")
-    lines.extend(details)
-    lines.append("")
-    lines.append("⚠️ Alerts:")
-    # simple alert example
-    for s in symbols:
-        info = fetch_symbol_yf(s)
-        if not info: continue
-        pct = info.get("pct") or 0
-        if pct >= 5:
-            lines.append(f"  {s} tăng mạnh {fm_pct(pct)}")
-        if pct <= -5:
-            lines.append(f"  {s} giảm mạnh {fm_pct(pct)}")
-    lines.append("")
-    lines.append(f"(Thời gian báo cáo: {now}) - Bot_fixed")
-    # Join with actual newline characters (not escaped)
-=======
-        info=yf_get_symbol(s)
-        if not info: 
-            lines.append(f"{s}: — (lỗi dữ liệu)"); continue
-        vol_ratio=None
-        if info.get('vol') and info.get('avg5_vol'):
-            try: vol_ratio=info['vol']/info['avg5_vol']
-            except: pass
-        vol_ratio_s=f" (VolRatio={vol_ratio:.2f}×)" if vol_ratio else ""
-        lines.append(f"{s}: {info['price']:.0f} {fm_pct(info['pct'])} | KL={fm_shares_million(info['vol'])}{vol_ratio_s} | TB tuần: {info.get('avg5_price') or '—'} / {fm_shares_million(info.get('avg5_vol'))}")
-    lines.append("")
-    lines.append("⚠️ Alerts:")
-    lines.append("")
-    lines.append(f"(Thời gian báo cáo: {now}) - Bot_fixed")
->>>>>>> parent of 6f7af73 (trước chạy được, cấu hình lại timezone)
-    return "\n".join(lines)
-
-def send_to_telegram(text):
-    if not BOT_TOKEN or not CHAT_ID:
-<<<<<<< HEAD
-        print("Missing BOT_TOKEN/CHAT_ID - printing preview:\\n")
-        print(text)
+        if shown is not None and s not in shown: continue
+        rows.append((s, q))
+    movers = top_movers(symbols, ctx) if len(symbols) >= TOP_MOVERS_MIN else ((), ())
+    for src, n in ctx.requests.items():
+        metrics.inc("upstream_requests", src, n)
+    timing = metrics.footer() if metrics.TIMING_FOOTER else None
+    dbg(ctx.summary())
+    return render.Report(now, idx, market, trend, rows, up, down, len(symbols), movers,
+                         delta_info, fired, timing)
+
+def build_report(symbols, ctx=None, delta=None, fmt="text", layout="full"):
+    """The report as text (or another render format)."""
+    return render.render(collect_report(symbols, ctx, delta), fmt, layout)
+
+def chat_variants(chat_ids=None):
+    """{(format, layout): [chat_id, ...]} from CHAT_FORMATS; unlisted chats get text/full."""
+    spec = {}
+    for item in CHAT_FORMATS.split(","):
+        chat, _, variant = item.strip().partition("=")
+        fmt, _, layout = variant.strip().partition(":")
+        fmt, layout = fmt or "text", layout or "full"
+        if not chat: continue
+        if fmt not in render.FORMATS or layout not in render.LAYOUTS:
+            dbg(f"CHAT_FORMATS: ignoring {item.strip()!r}"); continue
+        spec[chat.strip()] = (fmt, layout)
+    groups = {}
+    for c in (CHAT_IDS if chat_ids is None else chat_ids):
+        groups.setdefault(spec.get(c, ("text", "full")), []).append(c)
+    return groups
+
+def write_csv(report, path=None):
+    path = path or REPORT_CSV
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        f.write(render.render(report, "csv"))
+    os.replace(tmp, path)
+
+@metrics.timed("send_to_telegram")
+def send_to_telegram(report, edit=None, sent=None):
+    """Deliver the report to every chat, rendering each (format, layout) variant
+    once for all the chats that asked for it."""
+    if not BOT_TOKEN or not CHAT_IDS:
+        print("Missing BOT_TOKEN/CHAT_ID - printing preview:\n")
+        print(render.render(report))
         return False
-    base = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    ok = True
+    results = {}
+    for (fmt, layout), chats in chat_variants().items():
+        text = render.render(report, fmt, layout)
+        results.update(delivery.deliver(BOT_TOKEN, chats, text, log=dbg, edit=edit, sent=sent,
+                                        parse_mode=render.parse_mode(fmt)))
+    failed = [c for c, ok in results.items() if not ok]
+    if failed: dbg(f"Telegram delivery failed for {len(failed)}/{len(results)} chats: {failed}")
+    return bool(results) and not failed
+
+def publish(report, title="Report", edit=None, sent=None):
+    print(f"=== {title} preview ==="); print(render.render(report))
+    if REPORT_CSV:
+        try: write_csv(report)
+        except OSError as e: dbg("report csv error: "+str(e))
+    return send_to_telegram(report, edit=edit, sent=sent)
+
+def run_delta(ctx=None):
+    """One DELTA_MODE run: a full report on the first run of the day, afterwards
+    only the symbols that changed, edited into the day's update message."""
+    ctx = ctx if ctx is not None else RunContext()
+    prev = snapshot.load()
+    if prev is None or prev.day != scheduler.vn_now().strftime("%Y-%m-%d"):
+        publish(collect_report(SYMBOLS, ctx))
+        snapshot.save(snapshot.Snapshot.take(SYMBOLS, lambda s: ctx.get("symbol", s, YF_PERIOD), ctx.get("alert_state")))
+        return
+    report = collect_report(SYMBOLS, ctx, delta=prev)
+    nxt, n_changed = ctx.get("delta")
+    if not n_changed and not ctx.get("alerts"):
+        dbg(f"no symbol changed beyond the thresholds since {prev.time}, nothing sent")
+        return
+    sent = {}
+    publish(report, "Delta", edit=prev.messages, sent=sent)
+    nxt.messages.update({c: ids[-1] for c, ids in sent.items() if ids and ids[-1]})
+    snapshot.save(nxt)
+
+def run_once(ctx=None, processes=1):
+    """One report + delivery. ctx may already hold the symbols' quotes (merged
+    shards); with processes > 1 they are fetched by that many worker processes."""
+    metrics.begin_run()
+    if ctx is None and processes > 1:
+        with metrics.span("shards"):
+            ctx = shards.fetch_parallel(SYMBOLS, processes, YF_PERIOD, log=dbg)
+    if DELTA_MODE:
+        run_delta(ctx)
+    else:
+        publish(collect_report(SYMBOLS, ctx))
     try:
-        r = requests.post(base, data={"chat_id": CHAT_ID, "text": text, "disable_web_page_preview": True}, timeout=20)
-        print("Telegram response", r.status_code, r.text[:400])
-        if r.status_code != 200:
-            ok = False
+        alerts.save()
     except Exception as e:
-        print("Telegram send error", e)
-        ok = False
-=======
-        print("Missing BOT_TOKEN/CHAT_ID"); print(text); return False
-    url=f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    ok=True
-    for part in [text]:
-        try:
-            r=requests.post(url,data={"chat_id":CHAT_ID,"text":part})
-            dbg(f"Telegram response {r.status_code}: {r.text[:200]}")
-            if r.status_code!=200: ok=False
-        except Exception as e:
-            dbg("Telegram error: "+str(e)); ok=False
->>>>>>> parent of 6f7af73 (trước chạy được, cấu hình lại timezone)
-    return ok
+        dbg("alert state save error: "+str(e))
+    try:
+        metrics.export()
+    except Exception as e:
+        dbg("metrics export error: "+str(e))
+
+def warm_imports():
+    """Load what the enabled sources need (what a real run would import)."""
+    loaded = [m for m in (yf, pd, history_store, indicators) if m]
+    if USE_SCRAPERS: loaded.append(bool(scrapers))
+    if USE_VNSTOCK: loaded.append(bool(vnstock_api.load_vnstock()))
+    return loaded
 
-def main():
-    report=build_report(SYMBOLS)
-    print("=== Report preview ==="); print(report)
-    send_to_telegram(report)
+def profile_startup():
+    print("=== Startup import cost per package (fresh interpreter) ===")
+    base = lazy.profile_startup("import bot")
+    print(f"{'bot (eager imports)':<28}{sum(t for _, t in base):8.3f}s")
+    for name, t in base[:10]:
+        print(f"  {name:<26}{t:8.3f}s")
+    full = lazy.profile_startup("import bot; bot.warm_imports()")
+    base_names = {n for n, _ in base}
+    print(f"{'enabled sources (lazy)':<28}{sum(t for n, t in full if n not in base_names):8.3f}s")
+    for name, t in full:
+        if name not in base_names and t >= 0.001:
+            print(f"  {name:<26}{t:8.3f}s")
 
-if __name__=="__main__": main()
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="VN stock report bot")
+    ap.add_argument("--daemon", action="store_true", help="stay resident and report on every tick of the HOSE sessions")
+    ap.add_argument("--interval", type=int, default=DAEMON_INTERVAL, help="seconds between daemon ticks (default %(default)s)")
+    ap.add_argument("--always", action="store_true", help="daemon: tick even when the market is closed")
+    ap.add_argument("--serve", action="store_true", help="answer /quote, /watch, /watchlist commands (long-polling)")
+    ap.add_argument("--processes", type=int, default=1, help="fetch the watchlist in this many worker processes, one report")
+    ap.add_argument("--shard", metavar="I/N", help="fetch only shard I of N and write it to SHARD_DIR for --merge (no report)")
+    ap.add_argument("--merge", type=int, metavar="N", help="build and send one report from the N shard files in SHARD_DIR")
+    ap.add_argument("--profile-startup", action="store_true", help="print import cost per module for this configuration and exit")
+    args = ap.parse_args(argv)
+    if args.profile_startup:
+        try: profile_startup()
+        except RuntimeError as e: raise SystemExit(f"--profile-startup: {e}")
+        return
+    if args.serve:
+        if not BOT_TOKEN: raise SystemExit("--serve needs BOT_TOKEN")
+        import commands
+        dbg("command server: long-polling getUpdates")
+        commands.run(BOT_TOKEN, sys.modules[__name__], log=dbg)
+        return
+    if args.shard:
+        i, n = shards.parse_shard(args.shard)
+        t0 = time.monotonic()
+        path, count = shards.write_shard(SYMBOLS, i, n)
+        dbg(f"shard {i}/{n}: {count} symbols -> {path} in {time.monotonic() - t0:.2f}s")
+        return
+    if args.daemon:
+        dbg(f"daemon mode, interval={args.interval}s, symbols={len(SYMBOLS)}, processes={args.processes}")
+        scheduler.run_forever(functools.partial(run_once, processes=args.processes), interval=args.interval, always=args.always, log=dbg)
+    else:
+        t0 = time.monotonic()
+        if args.merge:
+            run_once(shards.load_shards(args.merge, YF_PERIOD, log=dbg))
+        else:
+            run_once(processes=args.processes)
+        dbg(f"run latency {time.monotonic() - t0:.2f}s")
+
+if __name__=="__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
+    except Exception as e:
+        print("Fatal", e)
+        traceback.print_exc()
@@ -0,0 +1,181 @@
+# cache.py - size-bounded TTL+LRU cache with an optional shared SQLite backend
+import os, time, pickle, sqlite3, threading
+from collections import OrderedDict
+
+CACHE_MAX = int(os.getenv("CACHE_MAX", "20000") or 20000)
+# set to a file path to share hot entries between runs / processes
+CACHE_DB = os.getenv("CACHE_DB", "").strip()
+# seconds between full scans for expired entries once the memory tier is full
+PURGE_INTERVAL = 60
+
+# per-kind TTL in seconds (or a callable returning seconds); daily bars are not
+# cached here, they live in the on-disk history store (history_store.py)
+TTL_POLICY = {
+    "quote": 30,            # intraday quote / per-symbol metrics
+    "market": 60,           # scraped index + totals
+    "foreign": 300,         # foreign-flow
+}
+# which kind each source's results are
+SOURCE_KIND = {"yfinance": "quote", "vietstock": "market", "cafef": "market", "vnstock": "foreign",
+               "symbol": "quote", "index": "quote", "market": "market"}
+
+def ttl_for(kind, default=60):
+    ttl = TTL_POLICY.get(kind, default)
+    return float(ttl() if callable(ttl) else ttl)
+
+_MISSING = object()
+
+class MemoryBackend:
+    """OrderedDict LRU; expired entries are dropped on access, and by a full scan
+    at most every PURGE_INTERVAL seconds when a set needs room. Otherwise a full
+    cache evicts from the LRU head in O(1)."""
+    def __init__(self, maxsize=CACHE_MAX):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.next_purge = 0.0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, now):
+        item = self.data.get(key, _MISSING)
+        if item is _MISSING: return _MISSING
+        value, exp = item
+        if now > exp:
+            del self.data[key]; self.expirations += 1
+            return _MISSING
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value, exp, now):
+        self.data[key] = (value, exp)
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize and now >= self.next_purge:
+            self.purge(now)
+            self.next_purge = now + PURGE_INTERVAL
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False); self.evictions += 1
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def purge(self, now):
+        for k in [k for k, (_, exp) in self.data.items() if now > exp]:
+            del self.data[k]; self.expirations += 1
+
+    def clear(self):
+        self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+class SQLiteBackend:
+    """Pickled values in one SQLite table (WAL), shared by every process using the same file.
+    get() returns (value, expires_at) so the memory tier keeps the same expiry."""
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v BLOB, exp REAL)")
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, now):
+        row = self.conn.execute("SELECT v, exp FROM cache WHERE k=?", (repr(key),)).fetchone()
+        if row is None: return _MISSING
+        if now > row[1]:
+            self.delete(key); self.expirations += 1
+            return _MISSING
+        try: return pickle.loads(row[0]), row[1]
+        except Exception: return _MISSING
+
+    def set(self, key, value, exp, now):
+        self.conn.execute("INSERT OR REPLACE INTO cache (k, v, exp) VALUES (?, ?, ?)", (repr(key), pickle.dumps(value), exp))
+
+    def delete(self, key):
+        self.conn.execute("DELETE FROM cache WHERE k=?", (repr(key),))
+
+    def purge(self, now):
+        cur = self.conn.execute("DELETE FROM cache WHERE exp < ?", (now,))
+        self.expirations += max(cur.rowcount, 0)
+
+    def clear(self):
+        self.conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+class Cache:
+    """In-memory LRU in front of an optional shared backend. Thread-safe; the
+    lock is never held across an await, so async handlers can use it too."""
+    def __init__(self, maxsize=CACHE_MAX, backend=None):
+        self.mem = MemoryBackend(maxsize)
+        self.backend = backend
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self.lock:
+            value = self.mem.get(key, now)
+            if value is _MISSING and self.backend is not None:
+                item = self.backend.get(key, now)
+                if item is not _MISSING:
+                    value, exp = item
+                    self.mem.set(key, value, exp, now)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=60, kind=None):
+        """Store value for ttl seconds, or for TTL_POLICY[kind] when kind is given."""
+        now = time.time()
+        exp = now + (ttl_for(kind, ttl) if kind else float(ttl))
+        with self.lock:
+            self.mem.set(key, value, exp, now)
+            if self.backend is not None:
+                try: self.backend.set(key, value, exp, now)
+                except Exception: pass
+
+    def delete(self, key):
+        with self.lock:
+            self.mem.delete(key)
+            if self.backend is not None: self.backend.delete(key)
+
+    def purge(self):
+        now = time.time()
+        with self.lock:
+            self.mem.purge(now)
+            if self.backend is not None: self.backend.purge(now)
+
+    def clear(self):
+        with self.lock:
+            self.mem.clear()
+            if self.backend is not None: self.backend.clear()
+
+    def stats(self):
+        with self.lock:
+            out = {"hits": self.hits, "misses": self.misses, "size": len(self.mem),
+                   "evictions": self.mem.evictions, "expirations": self.mem.expirations}
+            if self.backend is not None:
+                out["backend_expirations"] = self.backend.expirations
+            return out
+
+def _default_backend():
+    if not CACHE_DB: return None
+    try:
+        return SQLiteBackend(CACHE_DB)
+    except Exception as e:
+        print("[DEBUG] cache backend disabled:", e)
+        return None
+
+CACHE = Cache(CACHE_MAX, _default_backend())
+
+# old Archive/cache.py API
+def set_cache(key, value, ttl=60):
+    CACHE.set(key, value, ttl)
+
+def get_cache(key):
+    return CACHE.get(key)
@@ -0,0 +1,172 @@
+# commands.py - on-demand Telegram commands (/quote, /watch, ...) over getUpdates long-polling
+import os, re, json, asyncio, threading
+import delivery
+import httpclient
+from run_context import RunContext
+
+# seconds Telegram holds a getUpdates call open when there is nothing new
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "25") or 25)
+# updates handled at the same time; the rest wait for a free slot
+MAX_HANDLERS = int(os.getenv("COMMAND_HANDLERS", "32") or 32)
+WATCHLIST_FILE = os.getenv("WATCHLIST_FILE", ".watchlists.json")
+WATCHLIST_MAX = 50
+# symbols per /quote
+QUERY_MAX = 20
+
+_RE_SYMBOL = re.compile(r"^[A-Z0-9]{2,10}$")
+
+HELP = ("Lệnh:\n"
+        "/quote HPG SSI - giá hiện tại\n"
+        "/watch HPG SSI - thêm vào danh sách theo dõi\n"
+        "/unwatch HPG - bỏ khỏi danh sách\n"
+        "/watchlist - giá các mã đang theo dõi")
+
+def parse_symbols(args, limit=QUERY_MAX):
+    """Valid upper-case symbols from command arguments (commas or spaces), deduplicated."""
+    out = []
+    for tok in re.split(r"[\s,]+", args.upper()):
+        if _RE_SYMBOL.match(tok) and tok not in out:
+            out.append(tok)
+    return out[:limit]
+
+class Watchlists:
+    """Per-user symbol lists in a local JSON file ({user_id: [symbol, ...]})."""
+    def __init__(self, path=WATCHLIST_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.data = {str(k): list(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            self.data = {}
+
+    def get(self, user):
+        with self.lock:
+            return list(self.data.get(str(user), []))
+
+    def update(self, user, add=(), remove=()):
+        with self.lock:
+            cur = [s for s in self.data.get(str(user), []) if s not in remove]
+            cur += [s for s in add if s not in cur]
+            cur = cur[:WATCHLIST_MAX]
+            if cur: self.data[str(user)] = cur
+            else: self.data.pop(str(user), None)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            return list(cur)
+
+class CommandServer:
+    """Long-polls getUpdates and runs one handler task per update, so a slow
+    lookup for one user never holds up another. Blocking work (HTTP, cache,
+    downloads) runs in worker threads. Quotes come from the shared cache and
+    only symbols missing there are fetched; concurrent requests for the same
+    symbol share one fetch."""
+    def __init__(self, token, bot, log=print, watchlists=None):
+        self.bot = bot   # the bot module: fetch_symbols / symbol_line / YF_PERIOD
+        self.token = token
+        self.log = log
+        self.watchlists = watchlists or Watchlists()
+        self.offset = None
+        self.inflight = {}   # symbol -> Future of its fetch
+        self.slots = None
+
+    def _get_updates(self):
+        data = {"timeout": POLL_TIMEOUT, "allowed_updates": '["message"]'}
+        if self.offset is not None: data["offset"] = self.offset
+        # serve() owns the retries; the request still counts against the host's breaker
+        r = httpclient.CLIENT.request("POST", f"{delivery.API_BASE}/bot{self.token}/getUpdates", retries=0,
+                                      session=delivery.get_session(), data=data, timeout=POLL_TIMEOUT + 10)
+        r.raise_for_status()
+        return r.json().get("result", [])
+
+    def _reply(self, chat_id, text):
+        delivery.deliver(self.token, [chat_id], text, log=self.log)
+
+    def _fetch(self, symbols):
+        ctx = RunContext()
+        self.bot.fetch_symbols(symbols, ctx)
+        return {s: ctx.get("symbol", s, self.bot.YF_PERIOD) for s in symbols}
+
+    async def quotes(self, symbols):
+        """{symbol: Quote or None}; joins fetches already running for a symbol."""
+        loop = asyncio.get_running_loop()
+        mine = [s for s in symbols if s not in self.inflight]
+        if mine:
+            fut = loop.run_in_executor(None, self._fetch, mine)
+            for s in mine: self.inflight[s] = fut
+            fut.add_done_callback(lambda f: [self.inflight.pop(s) for s in mine if self.inflight.get(s) is f])
+        out = {}
+        for fut in {self.inflight[s] for s in symbols}:
+            try:
+                out.update(await asyncio.shield(fut))
+            except Exception as e:
+                self.log(f"quote fetch error: {e}")
+        return {s: out.get(s) for s in symbols}
+
+    async def render_quotes(self, symbols):
+        got = await self.quotes(symbols)
+        return "\n".join(self.bot.symbol_line(s, got[s]) for s in symbols)
+
+    async def handle(self, text, user):
+        """Reply text for one command message (None for non-commands)."""
+        if not text.startswith("/"): return None
+        cmd, _, args = text.partition(" ")
+        cmd = cmd.split("@", 1)[0].lower()
+        if cmd in ("/quote", "/q"):
+            symbols = parse_symbols(args)
+            if not symbols: return "Dùng: /quote HPG SSI"
+            return await self.render_quotes(symbols)
+        if cmd == "/watch":
+            symbols = parse_symbols(args, WATCHLIST_MAX)
+            if not symbols: return "Dùng: /watch HPG SSI"
+            cur = await asyncio.to_thread(self.watchlists.update, user, add=symbols)
+            return f"Đang theo dõi ({len(cur)}): {', '.join(cur)}"
+        if cmd == "/unwatch":
+            cur = await asyncio.to_thread(self.watchlists.update, user, remove=parse_symbols(args, WATCHLIST_MAX))
+            return f"Đang theo dõi ({len(cur)}): {', '.join(cur)}" if cur else "Danh sách theo dõi trống."
+        if cmd == "/watchlist":
+            symbols = self.watchlists.get(user)
+            if not symbols: return "Danh sách theo dõi trống. Dùng /watch HPG SSI"
+            return await self.render_quotes(symbols)
+        if cmd in ("/start", "/help"):
+            return HELP
+        return None
+
+    async def _run_update(self, update):
+        async with self.slots:
+            msg = update.get("message") or {}
+            text, chat = msg.get("text") or "", (msg.get("chat") or {}).get("id")
+            user = (msg.get("from") or {}).get("id", chat)
+            if chat is None: return
+            try:
+                reply = await self.handle(text.strip(), user)
+            except Exception as e:
+                self.log(f"command error {text!r}: {e}")
+                reply = "Lỗi xử lý lệnh, thử lại sau."
+            if reply:
+                await asyncio.to_thread(self._reply, chat, reply)
+
+    async def serve(self, max_polls=None):
+        """Poll forever (or max_polls times) and dispatch every update as its own task."""
+        self.slots = asyncio.Semaphore(MAX_HANDLERS)
+        tasks, polls, fails = set(), 0, 0
+        while max_polls is None or polls < max_polls:
+            polls += 1
+            try:
+                updates = await asyncio.to_thread(self._get_updates)
+                fails = 0
+            except Exception as e:
+                self.log(f"getUpdates error: {e}")
+                await asyncio.sleep(httpclient.backoff(fails, base=1, cap=30)); fails += 1
+                continue
+            for u in updates:
+                self.offset = max(self.offset or 0, u["update_id"] + 1)
+                t = asyncio.create_task(self._run_update(u))
+                tasks.add(t); t.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def run(token, bot, log=print):
+    asyncio.run(CommandServer(token, bot, log=log).serve())
@@ -0,0 +1,185 @@
+# delivery.py - Telegram delivery: pooled session, 4096-char chunking, rate limits, fan-out to many chats
+import os, time, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import httpclient
+
+API_BASE = os.getenv("TELEGRAM_API", "https://api.telegram.org")
+MAX_MESSAGE_LEN = 4096
+SEND_TIMEOUT = float(os.getenv("TG_TIMEOUT", "20") or 20)
+SEND_RETRIES = int(os.getenv("TG_RETRIES", "3") or 3)
+# parallel chats during fan-out
+FANOUT_WORKERS = int(os.getenv("TG_FANOUT_WORKERS", "8") or 8)
+
+# Bot API limits: ~30 msg/s overall, 1 msg/s per private chat, 20 msg/min per group
+GLOBAL_RATE = (30, 1.0)
+PRIVATE_CHAT_RATE = (1, 1.0)
+GROUP_CHAT_RATE = (20, 60.0)
+
+_limiters_lock = threading.Lock()
+
+def get_session():
+    """The shared client's keep-alive session for the Bot API host, with a pool
+    big enough for the fan-out."""
+    return httpclient.CLIENT.session(httpclient.host_of(API_BASE), FANOUT_WORKERS)
+
+def tg_len(text):
+    # Telegram counts message length in UTF-16 code units (emoji = 2)
+    return len(text.encode("utf-16-le")) // 2
+
+def split_message(text, limit=MAX_MESSAGE_LEN):
+    """Split text into chunks of at most limit, breaking only between lines
+    unless a single line is itself longer than limit."""
+    chunks, cur, cur_len = [], [], 0
+    for line in text.split("\n"):
+        n = tg_len(line)
+        while n > limit:
+            # hard-split an oversized line
+            if cur:
+                chunks.append("\n".join(cur)); cur, cur_len = [], 0
+            cut = limit
+            while tg_len(line[:cut]) > limit: cut -= 1
+            chunks.append(line[:cut]); line = line[cut:]; n = tg_len(line)
+        extra = n + (1 if cur else 0)
+        if cur and cur_len + extra > limit:
+            chunks.append("\n".join(cur)); cur, cur_len, extra = [], 0, n
+        cur.append(line); cur_len += extra
+    if cur:
+        chunks.append("\n".join(cur))
+    return [c for c in chunks if c.strip()]
+
+class RateLimiter:
+    """Sliding-window limiter: at most `count` acquisitions per `per` seconds."""
+    def __init__(self, count, per):
+        self.count, self.per = count, per
+        self.stamps = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.stamps and now - self.stamps[0] >= self.per:
+                    self.stamps.popleft()
+                if len(self.stamps) < self.count:
+                    self.stamps.append(now)
+                    return
+                wait = self.per - (now - self.stamps[0])
+            time.sleep(max(wait, 0.01))
+
+    def pause(self, seconds):
+        """Block this bucket for seconds (after a 429 retry_after)."""
+        with self.lock:
+            until = time.monotonic() + seconds - self.per
+            self.stamps.extend([until] * self.count)
+
+_global_limiter = RateLimiter(*GLOBAL_RATE)
+_chat_limiters = {}
+
+def chat_limiter(chat_id):
+    with _limiters_lock:
+        lim = _chat_limiters.get(chat_id)
+        if lim is None:
+            rate = GROUP_CHAT_RATE if str(chat_id).startswith("-") else PRIVATE_CHAT_RATE
+            lim = _chat_limiters[chat_id] = RateLimiter(*rate)
+        return lim
+
+def call_api(token, method, data, chat_id=None, log=print):
+    """POST one Bot API call honouring rate limits and 429 retry_after.
+
+    Returns the decoded JSON response on success, None after SEND_RETRIES failures.
+    """
+    url = f"{API_BASE}/bot{token}/{method}"
+    limiter = chat_limiter(chat_id) if chat_id is not None else None
+    for attempt in range(SEND_RETRIES + 1):
+        if limiter: limiter.acquire()
+        _global_limiter.acquire()
+        try:
+            # this loop owns the retries: each attempt has to pass the rate limiters
+            r = httpclient.CLIENT.request("POST", url, retries=0, session=get_session(), data=data, timeout=SEND_TIMEOUT)
+        except httpclient.CircuitOpen as e:
+            log(f"Telegram error {chat_id}: {e}")
+            return None
+        except Exception as e:
+            log(f"Telegram error {chat_id}: {e}")
+            time.sleep(httpclient.backoff(attempt))
+            continue
+        if r.status_code == 200:
+            try: return r.json()
+            except Exception: return {}
+        if r.status_code == 429:
+            try: retry_after = float(r.json().get("parameters", {}).get("retry_after", 1))
+            except Exception: retry_after = 1.0
+            log(f"Telegram 429 for {chat_id}, retry after {retry_after:g}s")
+            if limiter: limiter.pause(retry_after)
+            time.sleep(retry_after)
+            continue
+        if r.status_code == 400 and "message is not modified" in r.text:
+            return {}   # edit with identical text: nothing to do
+        log(f"Telegram response {r.status_code}: {r.text[:200]}")
+        if r.status_code < 500:
+            return None
+        time.sleep(httpclient.backoff(attempt))
+    return None
+
+def _message_id(resp):
+    try: return resp["result"]["message_id"]
+    except Exception: return None
+
+def _payload(data, parse_mode):
+    data["disable_web_page_preview"] = True
+    if parse_mode: data["parse_mode"] = parse_mode
+    return data
+
+def send_chat(token, chat_id, chunks, log=print, sent=None, parse_mode=None):
+    """Send chunks to one chat in order; stops at the first failed chunk.
+    The message_id of each chunk sent is appended to the list sent when given."""
+    for part in chunks:
+        metrics.inc("upstream_requests", "telegram")
+        metrics.inc("bytes", "telegram", len(part.encode("utf-8")))
+        resp = call_api(token, "sendMessage", _payload({"chat_id": chat_id, "text": part}, parse_mode), chat_id, log)
+        if resp is None:
+            metrics.inc("failures", "telegram")
+            return False
+        if sent is not None: sent.append(_message_id(resp))
+    return True
+
+def edit_chat(token, chat_id, message_id, text, log=print, parse_mode=None):
+    """Replace the text of an earlier message (editMessageText). False when the
+    edit was refused, e.g. the message is gone or older than Telegram allows."""
+    metrics.inc("upstream_requests", "telegram")
+    metrics.inc("bytes", "telegram", len(text.encode("utf-8")))
+    resp = call_api(token, "editMessageText", _payload({"chat_id": chat_id, "message_id": message_id, "text": text}, parse_mode), chat_id, log)
+    if resp is None:
+        metrics.inc("failures", "telegram")
+        return False
+    return True
+
+def _deliver_one(token, chat_id, chunks, log, edit, sent, parse_mode=None):
+    # a one-chunk text replaces the chat's earlier message when there is one
+    ids = sent.setdefault(chat_id, []) if sent is not None else None
+    message_id = (edit or {}).get(chat_id)
+    if message_id and len(chunks) == 1:
+        if edit_chat(token, chat_id, message_id, chunks[0], log, parse_mode):
+            if ids is not None: ids.append(message_id)
+            return True
+        log(f"Telegram edit failed for {chat_id}, sending a new message")
+    return send_chat(token, chat_id, chunks, log, ids, parse_mode)
+
+def deliver(token, chat_ids, text, log=print, edit=None, sent=None, parse_mode=None):
+    """Split text once and send it to every chat in parallel. Returns {chat_id: ok}.
+
+    edit: {chat_id: message_id} of messages to update in place instead of
+    posting new ones. sent: dict filled with {chat_id: [message_id, ...]}.
+    parse_mode: Telegram "HTML" / "MarkdownV2" for formatted text.
+    """
+    chunks = split_message(text)
+    if not chunks or not chat_ids: return {}
+    if len(chat_ids) == 1:
+        return {chat_ids[0]: _deliver_one(token, chat_ids[0], chunks, log, edit, sent, parse_mode)}
+    if sent is not None:
+        for c in chat_ids: sent.setdefault(c, [])
+    with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(chat_ids)), thread_name_prefix="tg") as pool:
+        futs = {c: pool.submit(_deliver_one, token, c, chunks, log, edit, sent, parse_mode) for c in chat_ids}
+        return {c: f.result() for c, f in futs.items()}
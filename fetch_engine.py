@@ -0,0 +1,103 @@
+# fetch_engine.py - run all source calls concurrently with per-source limits and a run deadline
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import metrics
+
+def _env_map(name, default):
+    """Parse "src=val,src=val" env overrides on top of a default dict."""
+    out = dict(default)
+    for part in os.getenv(name, "").split(","):
+        if "=" not in part: continue
+        k, v = part.split("=", 1)
+        try: out[k.strip()] = float(v)
+        except ValueError: pass
+    return out
+
+# max in-flight calls per source (FETCH_LIMITS="yfinance=4,vietstock=1"); jobs take the
+# semaphore of their job source, routed candidates (router.py) that of the real source
+SOURCE_LIMITS = _env_map("FETCH_LIMITS", {"yfinance": 4, "vietstock": 2, "cafef": 2, "vnstock": 2, "symbols": 4, "market": 1})
+# seconds a single call may run once started (FETCH_TIMEOUTS="cafef=5")
+# "symbols" / "market" are routed jobs (router.py) and cover the primary plus its hedge
+SOURCE_TIMEOUTS = _env_map("FETCH_TIMEOUTS", {"vietstock": 8, "cafef": 8, "vnstock": 15, "symbols": 40, "market": 12})
+# seconds for the whole fetch phase; whatever has not arrived by then is reported as missing
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", "45") or 45)
+MAX_WORKERS = int(os.getenv("FETCH_WORKERS", "16") or 16)
+
+_semaphores = {}
+_sem_lock = threading.Lock()
+# one pool per process so a resident daemon reuses its worker threads between ticks
+_pool = None
+
+def _semaphore(source):
+    with _sem_lock:
+        sem = _semaphores.get(source)
+        if sem is None:
+            sem = _semaphores[source] = threading.BoundedSemaphore(max(1, int(SOURCE_LIMITS.get(source, 2))))
+        return sem
+
+def limited(source, fn):
+    """fn wrapped to hold the in-flight slot of source while it runs."""
+    def wrapper(*args, **kwargs):
+        with _semaphore(source):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def _get_pool():
+    global _pool
+    with _sem_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+        return _pool
+
+def run_jobs(jobs, deadline=None, log=print):
+    """Run jobs concurrently and return {key: result} for the ones that finished in time.
+
+    jobs: {key: (source, fn, args, kwargs)}. A job is dropped when it raises,
+    runs longer than SOURCE_TIMEOUTS[source] after it started, or is still
+    pending when the global deadline (seconds from now) passes.
+    """
+    if not jobs: return {}
+    deadline = RUN_DEADLINE if deadline is None else deadline
+    end = time.monotonic() + deadline
+    started = {}
+
+    def call(key, source, fn, args, kwargs):
+        with _semaphore(source):
+            started[key] = time.monotonic()
+            return fn(*args, **kwargs)
+
+    results = {}
+    pool = _get_pool()
+    pending = {}
+    for key, (source, fn, args, kwargs) in jobs.items():
+        pending[pool.submit(call, key, source, fn, args, kwargs)] = (key, source)
+    while pending:
+        now = time.monotonic()
+        if now >= end:
+            log(f"fetch deadline ({deadline:g}s) passed, missing: {sorted(str(k) for k, _ in pending.values())}")
+            for _key, source in pending.values():
+                metrics.inc("failures", source)
+            break
+        # wake up at the earliest per-source timeout or the global deadline
+        next_wake = end
+        for key, source in pending.values():
+            if key in started:
+                next_wake = min(next_wake, started[key] + SOURCE_TIMEOUTS.get(source, deadline))
+        done, _ = wait(list(pending), timeout=max(0.0, next_wake - now), return_when=FIRST_COMPLETED)
+        for fut in done:
+            key, source = pending.pop(fut)
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                log(f"fetch error {source} {key}: {e}")
+                metrics.inc("failures", source)
+        now = time.monotonic()
+        for fut, (key, source) in list(pending.items()):
+            if key in started and now - started[key] > SOURCE_TIMEOUTS.get(source, deadline):
+                log(f"fetch timeout {source} {key} after {SOURCE_TIMEOUTS.get(source, deadline):g}s")
+                metrics.inc("failures", source)
+                pending.pop(fut)
+    # stragglers keep running in the pool; their results are simply discarded
+    for fut in pending:
+        fut.cancel()
+    return results
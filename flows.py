@@ -0,0 +1,220 @@
+# flows.py - append-only local time series of market totals, foreign flow and breadth, with rollups
+import os, json, time
+from datetime import datetime
+try:
+    import numpy as np
+except Exception:
+    np = None
+import scheduler
+
+FLOW_DIR = os.getenv("FLOW_DIR", ".flows")
+BUCKET = 300          # intraday rollup bucket (5 min)
+TREND_DAYS = 20
+# daily rows kept in the rollup state (the raw market series, ~100 rows a day, is never trimmed)
+KEEP_DAYS = 120
+# sessions of raw per-symbol ticks kept (one file per day); older days are deleted,
+# per-symbol daily bars already live in the history store
+TICK_DAYS = int(os.getenv("FLOW_TICK_DAYS", "1") or 1)
+# market rows scanned back for intraday(): one run per minute all day at most
+MAX_DAY_ROWS = 24 * 60
+
+# one row per run: index level, foreign buy/sell (day-to-date totals as scraped) and watchlist breadth
+MARKET_DTYPE = [("ts", "f8"), ("index", "f8"), ("pct", "f8"), ("fbuy", "f8"), ("fsell", "f8"),
+                ("up", "i4"), ("down", "i4"), ("flat", "i4")]
+# one row per symbol per run, in ticks/<day>.bin; sym indexes symbols.json
+TICK_DTYPE = [("ts", "f8"), ("sym", "i4"), ("price", "f8"), ("pct", "f8"), ("vol", "f8")]
+
+class Series:
+    """Fixed-size records appended to a flat binary file. Appends never rewrite
+    earlier bytes, so readers can resume from a byte offset."""
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+
+    def append(self, rows):
+        if not len(rows): return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(np.asarray(rows, dtype=self.dtype).tobytes())
+
+    def size(self):
+        try: return os.path.getsize(self.path) // self.dtype.itemsize
+        except OSError: return 0
+
+    def read(self, start=0):
+        """Rows from row number start on."""
+        n = self.size() - start
+        if n <= 0: return np.zeros(0, self.dtype)
+        return np.fromfile(self.path, dtype=self.dtype, count=n, offset=start * self.dtype.itemsize)
+
+def _f(v):
+    return np.nan if v is None else float(v)
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, scheduler.VN_TZ).strftime("%Y-%m-%d")
+
+class FlowStore:
+    def __init__(self, root=None):
+        self.root = root or FLOW_DIR
+        self.market = Series(os.path.join(self.root, "market.bin"), MARKET_DTYPE)
+        self.tick_dir = os.path.join(self.root, "ticks")
+        self.sym_path = os.path.join(self.root, "symbols.json")
+        self.state_path = os.path.join(self.root, "rollups.json")
+        self._symbols = None
+        self._state = None
+
+    # ---- symbol ids -----------------------------------------------------------------
+
+    def symbol_ids(self, symbols):
+        if self._symbols is None:
+            try:
+                with open(self.sym_path, encoding="utf-8") as f: self._symbols = json.load(f)
+            except (OSError, ValueError): self._symbols = []
+        pos = {s: i for i, s in enumerate(self._symbols)}
+        new = [s for s in symbols if s not in pos]
+        if new:
+            for s in new: pos[s] = len(self._symbols); self._symbols.append(s)
+            os.makedirs(self.root, exist_ok=True)
+            tmp = self.sym_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(self._symbols, f)
+            os.replace(tmp, self.sym_path)
+        return [pos[s] for s in symbols]
+
+    # ---- ticks ------------------------------------------------------------------------
+
+    def ticks(self, day):
+        return Series(os.path.join(self.tick_dir, f"{day}.bin"), TICK_DTYPE)
+
+    def tick_days(self):
+        try: names = os.listdir(self.tick_dir)
+        except OSError: return []
+        return sorted(n[:-4] for n in names if n.endswith(".bin"))
+
+    def trim_ticks(self, keep=TICK_DAYS):
+        """Delete the tick files of all but the last `keep` days."""
+        for d in self.tick_days()[:-max(keep, 1)]:
+            try: os.remove(os.path.join(self.tick_dir, f"{d}.bin"))
+            except OSError: pass
+        # single untrimmed file written by earlier versions
+        try: os.remove(os.path.join(self.root, "ticks.bin"))
+        except OSError: pass
+
+    # ---- writing ----------------------------------------------------------------------
+
+    def record(self, symbols, quote, market=None, now=None):
+        """Append this run's market row and one tick per symbol with a price
+        (to today's tick file; older days beyond TICK_DAYS are deleted)."""
+        now = time.time() if now is None else now
+        market = market or {}
+        qs = [quote(s) for s in symbols]
+        pcts = [q.pct for q in qs if q is not None and q.pct is not None]
+        up = sum(1 for p in pcts if p > 0); down = sum(1 for p in pcts if p < 0)
+        self.market.append([(now, _f(market.get("price")), _f(market.get("pct")), _f(market.get("foreign_buy")),
+                              _f(market.get("foreign_sell")), up, down, len(pcts) - up - down)])
+        have = [(s, q) for s, q in zip(symbols, qs) if q is not None and q.price is not None]
+        if have:
+            ids = self.symbol_ids([s for s, _ in have])
+            day = _day(now)
+            new_day = day not in self.tick_days()
+            self.ticks(day).append([(now, i, q.price, _f(q.pct), _f(q.vol)) for i, (_, q) in zip(ids, have)])
+            if new_day: self.trim_ticks()
+
+    # ---- rollups ------------------------------------------------------------------------
+
+    def _load_state(self):
+        if self._state is None:
+            try:
+                with open(self.state_path, encoding="utf-8") as f: self._state = json.load(f)
+            except (OSError, ValueError): self._state = {"rows": 0, "daily": {}}
+        return self._state
+
+    def update(self):
+        """Fold the market rows appended since the last call into the daily rollup
+        (the last row of each day: day-to-date foreign totals, closing breadth)."""
+        st = self._load_state()
+        rows = self.market.read(st["rows"])
+        if not len(rows): return st["daily"]
+        days = np.array([_day(t) for t in rows["ts"]])
+        # last row per day: positions where the next row is another day
+        last = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        for i in last.tolist():
+            r = rows[i]
+            prev = st["daily"].get(days[i], {})
+            st["daily"][days[i]] = {
+                "index": _keep(r["index"], prev.get("index")), "pct": _keep(r["pct"], prev.get("pct")),
+                "fbuy": _keep(r["fbuy"], prev.get("fbuy")), "fsell": _keep(r["fsell"], prev.get("fsell")),
+                "up": int(r["up"]), "down": int(r["down"]), "flat": int(r["flat"]),
+            }
+        for d in sorted(st["daily"])[:-KEEP_DAYS]:
+            del st["daily"][d]
+        st["rows"] += len(rows)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(st, f)
+        os.replace(tmp, self.state_path)
+        return st["daily"]
+
+    def intraday(self, day=None, bucket=BUCKET):
+        """Today's market rows rolled up per bucket: [(bucket_start_ts, index, foreign net
+        added in the bucket, up, down)]. Foreign totals are cumulative, so the net
+        flow of a bucket is the change of buy - sell."""
+        day = day or scheduler.vn_now().strftime("%Y-%m-%d")
+        # today's rows are at the tail of the file
+        rows = self.market.read(max(0, self.market.size() - MAX_DAY_ROWS))
+        rows = rows[np.array([_day(t) == day for t in rows["ts"]], dtype=bool)] if len(rows) else rows
+        if not len(rows): return []
+        b = (rows["ts"] // bucket).astype(np.int64)
+        last = np.flatnonzero(np.append(b[1:] != b[:-1], True))
+        net = rows["fbuy"][last] - rows["fsell"][last]
+        # carry the last known total over buckets without foreign data
+        seen = np.maximum.accumulate(np.where(np.isnan(net), -1, np.arange(len(net))))
+        net = np.where(seen >= 0, net[np.maximum(seen, 0)], 0.0)
+        flow = np.diff(np.concatenate([[0.0], net]))
+        return [(float(b[i] * bucket), _num(rows["index"][i]), float(flow[k]), int(rows["up"][i]), int(rows["down"][i]))
+                for k, i in enumerate(last.tolist())]
+
+    def trends(self, days=TREND_DAYS):
+        """Rolling view over the last `days` sessions of the daily rollup."""
+        daily = self.update()
+        keys = sorted(daily)[-days:]
+        if not keys: return {}
+        rows = [daily[k] for k in keys]
+        nets = [r["fbuy"] - r["fsell"] for r in rows if r["fbuy"] is not None and r["fsell"] is not None]
+        idx = [r["index"] for r in rows if r["index"] is not None]
+        breadth = [r["up"] / (r["up"] + r["down"]) for r in rows if r["up"] + r["down"]]
+        today = rows[-1]
+        return {
+            "days": len(keys),
+            "foreign_net": today["fbuy"] - today["fsell"] if today["fbuy"] is not None and today["fsell"] is not None else None,
+            "foreign_net_20d": sum(nets) if nets else None,
+            "index_change_20d": (idx[-1] / idx[0] - 1) * 100 if len(idx) >= 2 and idx[0] else None,
+            "breadth": today["up"] / (today["up"] + today["down"]) if today["up"] + today["down"] else None,
+            "breadth_20d": sum(breadth) / len(breadth) if breadth else None,
+        }
+
+    def symbol_series(self, symbol, bucket=BUCKET, since=None):
+        """Per-bucket (ts, last price, last pct) of one symbol over the kept tick days."""
+        ids = self.symbol_ids([symbol])
+        days = self.tick_days()
+        if not days: return []
+        rows = np.concatenate([self.ticks(d).read() for d in days])
+        rows = rows[rows["sym"] == ids[0]]
+        if since is not None: rows = rows[rows["ts"] >= since]
+        if not len(rows): return []
+        b = (rows["ts"] // bucket).astype(np.int64)
+        last = np.flatnonzero(np.append(b[1:] != b[:-1], True))
+        return [(float(b[i] * bucket), float(rows["price"][i]), _num(rows["pct"][i])) for i in last.tolist()]
+
+def _num(v):
+    return None if np.isnan(v) else float(v)
+
+def _keep(v, old):
+    # a run without a value for a field keeps what the day already had
+    return old if np.isnan(v) else float(v)
+
+STORE = None
+
+def store():
+    global STORE
+    if STORE is None: STORE = FlowStore()
+    return STORE
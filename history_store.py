@@ -0,0 +1,107 @@
+# history_store.py - on-disk daily OHLCV store (one .npy file per ticker), appended incrementally
+import os
+import scheduler
+
+try:
+    import numpy as np
+    import pandas as pd
+except Exception:
+    np = None
+    pd = None
+
+HISTORY_DIR = os.getenv("HISTORY_DIR", ".history")
+# how far back to go the first time a ticker is seen
+HISTORY_BACKFILL = os.getenv("HISTORY_BACKFILL", "1y")
+# bars kept per ticker (~2 years of sessions)
+HISTORY_MAX_BARS = int(os.getenv("HISTORY_MAX_BARS", "520") or 520)
+
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+BAR_DTYPE = [("ts", "datetime64[D]")] + [(f, "f8") for f in FIELDS]
+
+def _path(ticker, root=None):
+    name = ticker.replace("^", "_").replace("/", "_")
+    return os.path.join(root or HISTORY_DIR, f"{name}.npy")
+
+def load_bars(ticker, root=None):
+    """Stored bars for ticker as a structured array sorted by ts, or None."""
+    p = _path(ticker, root)
+    if np is None or not os.path.exists(p): return None
+    try:
+        return np.load(p, mmap_mode='r')
+    except Exception:
+        return None
+
+def last_bar_date(ticker, root=None):
+    bars = load_bars(ticker, root)
+    if bars is None or len(bars) == 0: return None
+    return bars['ts'][-1].astype(object)
+
+def frame_to_bars(hist):
+    """yfinance OHLCV DataFrame -> structured bar array (one row per day)."""
+    idx = hist.index
+    if getattr(idx, 'tz', None) is not None:
+        idx = idx.tz_localize(None)
+    bars = np.zeros(len(hist), dtype=BAR_DTYPE)
+    bars['ts'] = idx.values.astype('datetime64[D]')
+    for f in FIELDS:
+        bars[f] = hist[f].astype(float).values if f in hist else np.nan
+    return bars[~np.isnan(bars['Close'])]
+
+def append_bars(ticker, hist, root=None):
+    """Merge new bars into the store. Rows for dates already stored are replaced,
+    so the still-forming bar of today is refreshed on every run."""
+    if np is None or hist is None or hist.empty: return 0
+    new = frame_to_bars(hist)
+    if len(new) == 0: return 0
+    old = load_bars(ticker, root)
+    if old is not None and len(old):
+        old = old[old['ts'] < new['ts'].min()]
+        bars = np.concatenate([np.asarray(old), new])
+    else:
+        bars = new
+    bars = bars[np.argsort(bars['ts'], kind='stable')][-HISTORY_MAX_BARS:]
+    p = _path(ticker, root)
+    os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+    tmp = p + ".tmp.npy"
+    np.save(tmp, bars)
+    os.replace(tmp, p)
+    return len(new)
+
+def bars_frame(ticker, bars=None, root=None):
+    """Stored bars as a DataFrame shaped like yfinance history (Open..Volume, DatetimeIndex)."""
+    data = load_bars(ticker, root)
+    if data is None or len(data) == 0: return None
+    if bars: data = data[-bars:]
+    return pd.DataFrame({f: np.asarray(data[f]) for f in FIELDS}, index=pd.DatetimeIndex(np.asarray(data['ts']).astype('datetime64[ns]')))
+
+def sync_history(tickers, download, root=None, today=None):
+    """Bring the store up to date for tickers and return {ticker: DataFrame}.
+
+    download(tickers, period=None, start=None) must return {ticker: DataFrame}.
+    Tickers are grouped by their last stored date so the usual case (every
+    ticker up to yesterday) is still a single bulk request that re-fetches only
+    the last stored bar onwards.
+
+    Only tickers the download returned bars for, or whose stored bars already
+    reach today (VN time), are returned: when the download fails, older stored
+    bars would otherwise be reported as the current quote.
+    """
+    today = today or scheduler.vn_now().date()
+    synced = set()
+    groups = {}
+    for t in tickers:
+        groups.setdefault(last_bar_date(t, root), []).append(t)
+    for start, group in groups.items():
+        if start is None:
+            fetched = download(group, period=HISTORY_BACKFILL)
+        else:
+            fetched = download(group, start=start.isoformat())
+        for t, hist in fetched.items():
+            if hist is not None and not hist.empty: synced.add(t)
+            append_bars(t, hist, root)
+    frames = {}
+    for t in tickers:
+        if t not in synced and last_bar_date(t, root) != today: continue
+        f = bars_frame(t, root=root)
+        if f is not None: frames[t] = f
+    return frames
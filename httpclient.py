@@ -0,0 +1,196 @@
+# httpclient.py - shared HTTP layer: per-host keep-alive pools, jittered backoff, circuit breakers, request coalescing
+import os, time, random, threading
+from urllib.parse import urlsplit
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+# (connect, read) timeout applied when a caller gives none
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "4") or 4)
+READ_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10") or 10)
+# extra attempts after a connection error / timeout / 5xx
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2") or 2)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+# keep-alive connections per host
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8") or 8)
+# consecutive failures that open a host's breaker, and seconds before it lets a probe through
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5") or 5)
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "60") or 60)
+RETRY_STATUSES = (500, 502, 503, 504)
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; Bot/1.0)"}
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised without touching the network while a host's breaker is open."""
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Seconds to wait before retry number attempt + 1: full jitter, uniform in
+    [0, min(cap, base * 2**attempt)], so callers that failed together do not
+    come back together."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def host_of(url):
+    return urlsplit(url).netloc or url
+
+class Breaker:
+    """Per-host circuit breaker. Closed until `failures` consecutive failures,
+    then open (calls fail fast) for `reset` seconds, then half-open: one probe
+    call goes through and closes it on success or re-opens it on failure."""
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures, self.reset = failures, reset
+        self.fails = 0
+        self.opened = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def state(self):
+        if self.opened is None: return "closed"
+        return "half-open" if self.probing or time.monotonic() - self.opened >= self.reset else "open"
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None: return True
+            if not self.probing and time.monotonic() - self.opened >= self.reset:
+                self.probing = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.fails, self.opened, self.probing = 0, None, False
+
+    def failure(self):
+        with self.lock:
+            self.fails += 1
+            if self.probing or self.fails >= self.failures:
+                self.opened = time.monotonic()
+            self.probing = False
+
+class Client:
+    """One per process (CLIENT). Every upstream call goes through request() for
+    HTTP or call() for libraries with their own transport (yfinance, vnstock);
+    both share the host's breaker, retry policy and latency histogram."""
+    def __init__(self, retries=HTTP_RETRIES, pool_size=POOL_SIZE):
+        self.retries = retries
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._breakers = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def session(self, host, pool_size=None):
+        """The keep-alive session of host (created on first use)."""
+        with self._lock:
+            s = self._sessions.get(host)
+            if s is None:
+                s = requests.Session()
+                s.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or self.pool_size)
+                s.mount("https://", adapter); s.mount("http://", adapter)
+                self._sessions[host] = s
+            return s
+
+    def breaker(self, host):
+        with self._lock:
+            b = self._breakers.get(host)
+            if b is None: b = self._breakers[host] = Breaker()
+            return b
+
+    def _attempts(self, host, retries):
+        """Yields attempt numbers while the breaker allows, sleeping the backoff between them."""
+        br = self.breaker(host)
+        for attempt in range((self.retries if retries is None else retries) + 1):
+            if attempt:
+                metrics.inc("retries", host)
+                time.sleep(backoff(attempt - 1))
+            if not br.allow():
+                raise CircuitOpen(f"{host}: circuit open after {br.fails} failures")
+            yield attempt, br
+
+    def request(self, method, url, retries=None, session=None, coalesce=None, **kw):
+        """session.request with the host's breaker, retries and latency histogram.
+        Returns the response (a 5xx only after the retries are used up); raises
+        CircuitOpen or the last requests exception.
+
+        Identical GETs in flight at the same time (same url / params / headers,
+        not streamed) share one response unless coalesce=False."""
+        if coalesce is None: coalesce = method.upper() == "GET" and not kw.get("stream")
+        if coalesce:
+            key = (host_of(url), method.upper(), url, repr(sorted((kw.get("params") or {}).items())),
+                   repr(sorted((kw.get("headers") or {}).items())))
+            return self.coalesce(key, self._request, method, url, retries, session, **kw)
+        return self._request(method, url, retries, session, **kw)
+
+    def _request(self, method, url, retries, session, **kw):
+        host = host_of(url)
+        kw.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        sess = session or self.session(host)
+        last = (self.retries if retries is None else retries)
+        for attempt, br in self._attempts(host, retries):
+            t0 = time.perf_counter()
+            try:
+                r = getattr(sess, method.lower())(url, **kw)
+            except requests.RequestException:
+                metrics.observe("http", host, time.perf_counter() - t0)
+                br.failure()
+                if attempt >= last: raise
+                continue
+            metrics.observe("http", host, time.perf_counter() - t0)
+            if r.status_code not in RETRY_STATUSES:
+                br.success()
+                return r
+            br.failure()
+            if attempt >= last: return r
+            r.close()
+
+    def call(self, host, fn, *args, retries=None, **kwargs):
+        """fn(*args, **kwargs) for a library that does its own HTTP, under the
+        breaker / retry policy / histogram of the pseudo-host `host`."""
+        last = (self.retries if retries is None else retries)
+        for attempt, br in self._attempts(host, retries):
+            t0 = time.perf_counter()
+            try:
+                res = fn(*args, **kwargs)
+            except Exception:
+                metrics.observe("http", host, time.perf_counter() - t0)
+                br.failure()
+                if attempt >= last: raise
+                continue
+            metrics.observe("http", host, time.perf_counter() - t0)
+            br.success()
+            return res
+
+    def coalesce(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs) run once for all concurrent callers with the same
+        key (a tuple starting with the host): the first runs it, the others wait
+        and get its result (or exception)."""
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader: fut = self._inflight[key] = Future()
+        if not leader:
+            metrics.inc("coalesced", key[0])
+            return fut.result()
+        try:
+            res = fn(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(res)
+            return res
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is fut: del self._inflight[key]
+
+    def stats(self):
+        """{host: {"state", "count", "p50", "p95"}} from the latency histograms and breakers."""
+        hist = metrics.histogram("http")
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {h: {"state": breakers[h].state() if h in breakers else "closed",
+                    "count": v["count"], "p50": v["p50"], "p95": v["p95"]}
+                for h, v in hist.items()}
+
+CLIENT = Client()
@@ -0,0 +1,168 @@
+# indicators.py - vectorized indicators over a symbols x days panel (one pass for the whole watchlist)
+import warnings
+try:
+    import numpy as np
+    import pandas as pd
+except Exception:
+    np = None
+    pd = None
+from quotes import Quote
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+YEAR_BARS = 252
+
+def build_panel(symbols, frames, field):
+    """{symbol: OHLCV DataFrame} -> 2-D float array (len(symbols) x days) on the union of dates.
+
+    Rows for symbols without a frame (or without the field) are all-NaN.
+    """
+    cols = {s: frames[s][field] for s in symbols if s in frames and frames[s] is not None and field in frames[s]}
+    if not cols:
+        return np.full((len(symbols), 0), np.nan)
+    df = pd.concat(cols, axis=1).sort_index().reindex(columns=list(symbols))
+    return df.to_numpy(dtype=float).T
+
+def right_align(panel, mask=None):
+    """Shift each row's valid (non-NaN) values to the right, keeping their order.
+
+    After this the last column is every symbol's last bar, the one before it
+    the previous bar and so on, which matches per-symbol Series.dropna().
+    Pass mask to align another panel (e.g. volume) on close's valid bars.
+    """
+    valid = ~np.isnan(panel) if mask is None else mask
+    order = np.argsort(valid, axis=1, kind="stable")
+    out = np.take_along_axis(panel, order, axis=1)
+    out[~np.take_along_axis(valid, order, axis=1)] = np.nan
+    return out
+
+def tail_mean(x, n):
+    """Mean of the last n columns; NaN for rows with fewer than n bars."""
+    if x.shape[1] < n:
+        return np.full(x.shape[0], np.nan)
+    return x[:, -n:].mean(axis=1)
+
+def wilder(x, n):
+    """Wilder smoothing of each row, seeded with the mean of its first n values.
+
+    Loops over time only (vectorized over symbols); rows may start at
+    different columns (NaN prefix from right_align)."""
+    rows, cols = x.shape
+    avg = np.full(rows, np.nan)
+    total = np.zeros(rows)
+    count = np.zeros(rows, dtype=int)
+    for t in range(cols):
+        v = x[:, t]
+        ok = ~np.isnan(v)
+        count += ok
+        warm = ok & (count <= n)
+        total[warm] += v[warm]
+        seed = ok & (count == n)
+        avg[seed] = total[seed] / n
+        roll = ok & (count > n)
+        avg[roll] = (avg[roll] * (n - 1) + v[roll]) / n
+    return avg
+
+def _safe_div(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = a / b
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+def compute(close, volume=None, high=None, low=None, open_=None):
+    """All metrics for all rows of the panels in one pass.
+
+    close/volume/high/low/open_ are symbols x days arrays on the same dates.
+    Returns {metric: 1-D array}; NaN where a symbol has too little history.
+    """
+    valid = ~np.isnan(close)
+    c = right_align(close)
+    last = c[:, -1] if c.shape[1] else np.full(c.shape[0], np.nan)
+    prev = c[:, -2] if c.shape[1] >= 2 else np.full(c.shape[0], np.nan)
+    prev = np.where(np.isnan(prev), last, prev)
+    pct = (_safe_div(last, prev) - 1) * 100
+    pct[(prev == 0) & ~np.isnan(last)] = 0.0
+
+    out = {
+        "price": last,
+        "pct": pct,
+        "sma5": tail_mean(c, 5),
+        "sma20": tail_mean(c, 20),
+        "sma50": tail_mean(c, 50),
+    }
+
+    if open_ is not None:
+        # today's open against yesterday's close
+        o = right_align(open_, valid)
+        o_last = o[:, -1] if o.shape[1] else np.full(o.shape[0], np.nan)
+        out["gap"] = (_safe_div(o_last, prev) - 1) * 100
+
+    if volume is not None:
+        v = right_align(volume, valid)
+        out["vol"] = v[:, -1] if v.shape[1] else np.full(v.shape[0], np.nan)
+        out["avgvol20"] = tail_mean(v, 20)
+        out["vol_ratio"] = _safe_div(out["vol"], out["avgvol20"])
+
+    # RSI (Wilder) on close-to-close changes
+    diff = np.diff(c, axis=1)
+    gain = wilder(np.where(np.isnan(diff), np.nan, np.clip(diff, 0, None)), RSI_PERIOD)
+    loss = wilder(np.where(np.isnan(diff), np.nan, np.clip(-diff, 0, None)), RSI_PERIOD)
+    rs = _safe_div(gain, loss)
+    rsi = 100 - 100 / (1 + rs)
+    rsi[(loss == 0) & ~np.isnan(gain)] = 100.0
+    out["rsi14"] = rsi
+
+    if high is not None and low is not None:
+        h = right_align(high, valid)
+        l = right_align(low, valid)
+        prev_c = np.concatenate([np.full((c.shape[0], 1), np.nan), c[:, :-1]], axis=1)
+        with np.errstate(invalid="ignore"):
+            tr = np.fmax(h - l, np.fmax(np.abs(h - prev_c), np.abs(l - prev_c)))
+        out["atr14"] = wilder(tr, ATR_PERIOD)
+        hi_src, lo_src = h, l
+    else:
+        hi_src, lo_src = c, c
+    with warnings.catch_warnings():
+        # all-NaN rows (no history) just give NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        hi52 = np.nanmax(hi_src[:, -YEAR_BARS:], axis=1) if c.shape[1] else np.full(c.shape[0], np.nan)
+        lo52 = np.nanmin(lo_src[:, -YEAR_BARS:], axis=1) if c.shape[1] else np.full(c.shape[0], np.nan)
+    out["high52"] = hi52
+    out["low52"] = lo52
+    out["high52_dist"] = (_safe_div(last, hi52) - 1) * 100
+    out["low52_dist"] = (_safe_div(last, lo52) - 1) * 100
+    return out
+
+def _col(m, key, cast=float):
+    """Column key of compute() output as a list of Python numbers (None for NaN or absent)."""
+    if key not in m: return None
+    return [cast(v) if v == v else None for v in m[key].tolist()]
+
+def symbol_infos(symbols, frames, source="yfinance"):
+    """{symbol: OHLCV DataFrame} -> {symbol: Quote} for the symbols with a price.
+
+    Each indicator column is converted to Python numbers once for the whole
+    panel and written straight into the Quote slots."""
+    symbols = list(symbols)
+    if not symbols: return {}
+    panels = {f: build_panel(symbols, frames, f) for f in ("Close", "Volume", "High", "Low", "Open")}
+    has_hl = panels["High"].size and panels["Low"].size
+    m = compute(panels["Close"], panels["Volume"] if panels["Volume"].size else None,
+                panels["High"] if has_hl else None, panels["Low"] if has_hl else None,
+                panels["Open"] if panels["Open"].size else None)
+    cols = {
+        "price": _col(m, "price"), "pct": _col(m, "pct"),
+        "vol": _col(m, "vol", int), "avg5_price": _col(m, "sma5"), "avg5_vol": _col(m, "avgvol20", int),
+        "vol_ratio": _col(m, "vol_ratio"), "sma20": _col(m, "sma20"), "sma50": _col(m, "sma50"),
+        "rsi14": _col(m, "rsi14"), "atr14": _col(m, "atr14"),
+        "high52_dist": _col(m, "high52_dist"), "low52_dist": _col(m, "low52_dist"), "gap": _col(m, "gap"),
+    }
+    cols = [(name, col) for name, col in cols.items() if col is not None]
+    prices = cols[0][1]
+    infos = {}
+    for i, s in enumerate(symbols):
+        if prices[i] is None: continue
+        q = infos[s] = Quote(s, source)
+        for name, col in cols:
+            setattr(q, name, col[i])
+    return infos
@@ -0,0 +1,79 @@
+# lazy.py - deferred imports: a module (and its dependencies) loads on first use, not at startup
+import os, sys, time, importlib, threading, subprocess
+from collections import defaultdict
+
+# module name -> seconds its (first) import took through this layer
+IMPORT_TIMES = {}
+_lock = threading.RLock()
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    With several names the first one that imports wins (e.g. vnstock, then
+    vnstock3). bool(mod) imports it and is False when none of the names import,
+    replacing the old `try: import x except: x = None` / `x is None` checks.
+    Only an ImportError makes a module missing; any other error raised while
+    importing it (a bug in the module) propagates.
+    """
+    def __init__(self, *names):
+        self._names = names
+        self._mod = None
+        self._failed = False
+        self._error = None
+
+    def _load(self):
+        if self._mod is not None or self._failed:
+            return self._mod
+        with _lock:
+            if self._mod is None and not self._failed:
+                for name in self._names:
+                    t0 = time.perf_counter()
+                    try:
+                        mod = importlib.import_module(name)
+                    except ImportError as e:
+                        self._error = e
+                        continue
+                    IMPORT_TIMES.setdefault(name, time.perf_counter() - t0)
+                    self._mod = mod
+                    break
+                else:
+                    self._failed = True
+        return self._mod
+
+    def __getattr__(self, attr):
+        mod = self._load()
+        if mod is None:
+            raise ImportError(f"none of {', '.join(self._names)} could be imported") from self._error
+        return getattr(mod, attr)
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __repr__(self):
+        state = "loaded" if self._mod is not None else ("missing" if self._failed else "not loaded")
+        return f"<lazy {'/'.join(self._names)} ({state})>"
+
+def module(*names):
+    return LazyModule(*names)
+
+def profile_startup(code="import bot", top=25):
+    """Run code in a fresh interpreter under -X importtime and return
+    [(top-level package, seconds)], slowest first. Each package gets the self
+    time of all its submodules, wherever in the import tree they were pulled in.
+    The interpreter runs in this directory so the bot's modules import from
+    anywhere; RuntimeError (with its stderr) when code fails."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        err = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        raise RuntimeError(f"{code!r} failed (exit {proc.returncode}):\n" + "\n".join(err[-20:]))
+    totals = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line: continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit(): continue
+        name = parts[2].strip()
+        if not name: continue
+        totals[name.split(".")[0]] += int(parts[0]) / 1e6
+    return sorted(totals.items(), key=lambda kv: -kv[1])[:top]
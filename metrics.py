@@ -0,0 +1,153 @@
+# metrics.py - stage spans + per-source counters for each run, exported as Prometheus text or JSON lines
+import os, time, json, threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# METRICS_FILE=/var/lib/node_exporter/stockbot.prom (Prometheus textfile) or runs.jsonl (one line per run)
+METRICS_FILE = os.getenv("METRICS_FILE", "").strip()
+# append a one-line timing footer to the report
+TIMING_FOOTER = os.getenv("REPORT_TIMING_FOOTER", "0") == "1"
+
+COUNTER_NAMES = ("upstream_requests", "bytes", "cache_hits", "cache_misses", "failures", "retries", "coalesced")
+# upper bounds (s) of the latency histogram buckets (Prometheus "le"); +Inf is implicit
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+# process lifetime totals (what Prometheus scrapes)
+_span_totals = defaultdict(lambda: [0, 0.0, 0.0])    # name -> [count, sum_s, max_s]
+_counter_totals = defaultdict(float)                # (counter, source) -> value
+_histograms = {}                                    # (name, label) -> [bucket counts + [+Inf], sum]
+# current run
+_run = {"start": None, "spans": defaultdict(float), "counters": defaultdict(float)}
+
+def begin_run():
+    with _lock:
+        _run["start"] = time.time()
+        _run["spans"] = defaultdict(float)
+        _run["counters"] = defaultdict(float)
+
+def record_span(name, seconds):
+    with _lock:
+        tot = _span_totals[name]
+        tot[0] += 1; tot[1] += seconds; tot[2] = max(tot[2], seconds)
+        _run["spans"][name] += seconds
+
+@contextmanager
+def span(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - t0)
+
+def traced(name, fn):
+    """fn wrapped in a span called name."""
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+    wrapper.__name__ = getattr(fn, "__name__", name)
+    return wrapper
+
+def timed(name):
+    """Decorator form of traced."""
+    return lambda fn: traced(name, fn)
+
+def inc(counter, source, n=1):
+    with _lock:
+        _counter_totals[(counter, source)] += n
+        _run["counters"][(counter, source)] += n
+
+def observe(name, label, seconds):
+    """Add one observation to the histogram name{label} (process lifetime)."""
+    with _lock:
+        h = _histograms.get((name, label))
+        if h is None: h = _histograms[(name, label)] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        i = 0
+        while i < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[i]: i += 1
+        h[0][i] += 1
+        h[1] += seconds
+
+def histogram(name):
+    """{label: {"count", "sum", "buckets": [(le, cumulative count)], "p50", "p95"}}
+    with percentiles estimated from the bucket bounds."""
+    with _lock:
+        rows = {label: (list(h[0]), h[1]) for (n, label), h in _histograms.items() if n == name}
+    out = {}
+    bounds = LATENCY_BUCKETS + (float("inf"),)
+    for label, (counts, total) in rows.items():
+        cum, acc = [], 0
+        for le, c in zip(bounds, counts):
+            acc += c; cum.append((le, acc))
+        pick = lambda q: next((le for le, c in cum if c >= q * acc), None)
+        out[label] = {"count": acc, "sum": total, "buckets": cum, "p50": pick(0.5), "p95": pick(0.95)}
+    return out
+
+def run_spans():
+    with _lock:
+        return dict(_run["spans"])
+
+def run_counter(counter):
+    with _lock:
+        return sum(v for (c, _), v in _run["counters"].items() if c == counter)
+
+def footer():
+    """One line for the end of the report: fetch time, total so far, upstream requests."""
+    spans = run_spans()
+    elapsed = time.time() - _run["start"] if _run["start"] else spans.get("build_report", 0.0)
+    fetch = spans.get("fetch_market")
+    fetch_s = f"dữ liệu {fetch:.2f}s · " if fetch is not None else ""
+    return f"⏱ {fetch_s}tổng {elapsed:.2f}s · {int(run_counter('upstream_requests'))} req · {int(run_counter('failures'))} lỗi"
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        lines.append("# HELP stockbot_span_seconds Time spent per stage.")
+        lines.append("# TYPE stockbot_span_seconds summary")
+        for name, (count, total, _mx) in sorted(_span_totals.items()):
+            lines.append(f'stockbot_span_seconds_count{{span="{name}"}} {count}')
+            lines.append(f'stockbot_span_seconds_sum{{span="{name}"}} {total:.6f}')
+        lines.append("# HELP stockbot_span_max_seconds Slowest observation per stage.")
+        lines.append("# TYPE stockbot_span_max_seconds gauge")
+        for name, (_c, _t, mx) in sorted(_span_totals.items()):
+            lines.append(f'stockbot_span_max_seconds{{span="{name}"}} {mx:.6f}')
+        for counter in COUNTER_NAMES:
+            rows = sorted((src, v) for (c, src), v in _counter_totals.items() if c == counter)
+            if not rows: continue
+            lines.append(f"# TYPE stockbot_{counter}_total counter")
+            for src, v in rows:
+                lines.append(f'stockbot_{counter}_total{{source="{src}"}} {v:g}')
+        names = sorted({n for n, _ in _histograms})
+    for name in names:
+        lines.append(f"# TYPE stockbot_{name}_seconds histogram")
+        for label, h in sorted(histogram(name).items()):
+            for le, c in h["buckets"]:
+                le = "+Inf" if le == float("inf") else f"{le:g}"
+                lines.append(f'stockbot_{name}_seconds_bucket{{host="{label}",le="{le}"}} {c}')
+            lines.append(f'stockbot_{name}_seconds_sum{{host="{label}"}} {h["sum"]:.6f}')
+            lines.append(f'stockbot_{name}_seconds_count{{host="{label}"}} {h["count"]}')
+    with _lock:
+        if _run["start"]:
+            lines.append("# TYPE stockbot_last_run_timestamp_seconds gauge")
+            lines.append(f"stockbot_last_run_timestamp_seconds {_run['start']:.0f}")
+    return "\n".join(lines) + "\n"
+
+def run_record():
+    with _lock:
+        counters = defaultdict(dict)
+        for (c, src), v in _run["counters"].items():
+            counters[c][src] = v
+        return {"ts": _run["start"], "spans": {k: round(v, 6) for k, v in _run["spans"].items()}, "counters": counters}
+
+def export(path=None):
+    """Write the metrics: .jsonl/.json files get one appended line per run,
+    anything else is (atomically) rewritten in Prometheus text format."""
+    path = path or METRICS_FILE
+    if not path: return
+    if path.endswith((".jsonl", ".json")):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run_record(), ensure_ascii=False) + "\n")
+    else:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(prometheus_text())
+        os.replace(tmp, path)
@@ -0,0 +1,50 @@
+from quotes import Quote
+
+
+def normalize_market_record(rec, source_name):
+    out = {"price": None, "pct": None, "gtgd": None, "foreign_buy": None, "foreign_sell": None, "source": source_name}
+    if not rec:
+        return out
+    for k in ('price','last','close','index'):
+        if k in rec and rec[k] is not None:
+            out['price'] = rec[k]; break
+    for k in ('pct','pct_change','percentChange','changePercent'):
+        if k in rec and rec[k] is not None:
+            out['pct'] = rec[k]; break
+    for k in ('fbuy','buy','buy_value','buy_total'):
+        if k in rec and rec[k] is not None:
+            out['foreign_buy'] = rec[k]; break
+    for k in ('fsell','sell','sell_value','sell_total'):
+        if k in rec and rec[k] is not None:
+            out['foreign_sell'] = rec[k]; break
+    out['source'] = source_name
+    return out
+
+def _first(rec, *keys):
+    # first non-None value: 0 / 0.0 are real readings, not missing ones
+    for k in keys:
+        v = rec.get(k)
+        if v is not None:
+            return v
+    return None
+
+def normalize_symbol_record(rec, source_name):
+    """Any source's per-symbol record -> Quote. A Quote is relabelled in place,
+    a dict is read straight into a new Quote's slots."""
+    if isinstance(rec, Quote):
+        rec.source = source_name
+        return rec
+    out = Quote(source=source_name)
+    if not rec or not isinstance(rec, dict):
+        return out
+    out.symbol = _first(rec, 'symbol', 'ticker')
+    out.price = _first(rec, 'price', 'last', 'close')
+    out.pct = _first(rec, 'pct', 'percentChange', 'changePercent')
+    out.vol = _first(rec, 'vol', 'volume', 'nmVol')
+    out.avg5_price = _first(rec, 'avg5_price', 'avg5', 'avg_price')
+    out.avg5_vol = _first(rec, 'avg5_vol', 'avgvol20', 'avgvol')
+    out.sma20 = rec.get('sma20'); out.sma50 = rec.get('sma50')
+    # indicator fields some sources already computed
+    out.vol_ratio = rec.get('vol_ratio'); out.rsi14 = rec.get('rsi14'); out.atr14 = rec.get('atr14')
+    out.high52_dist = rec.get('high52_dist'); out.low52_dist = rec.get('low52_dist')
+    return out
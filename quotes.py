@@ -0,0 +1,35 @@
+# quotes.py - compact per-symbol quote record shared by the sources, normalizers and the report
+QUOTE_FIELDS = ("symbol", "source", "price", "pct", "vol", "avg5_price", "avg5_vol", "vol_ratio",
+                "sma20", "sma50", "rsi14", "atr14", "high52_dist", "low52_dist", "gap")
+
+class Quote:
+    """One symbol's snapshot. __slots__ keeps it to a fixed-size object (no
+    per-instance dict), so a whole-market watchlist is cheap to hold and rebuild
+    every tick. Missing values are None."""
+    __slots__ = QUOTE_FIELDS
+
+    def __init__(self, symbol=None, source=None, **values):
+        self.symbol = symbol
+        self.source = source
+        for name in QUOTE_FIELDS[2:]:
+            setattr(self, name, values.get(name))
+
+    def get(self, name, default=None):
+        # dict-style read for callers that still treat quotes as records
+        v = getattr(self, name, None)
+        return default if v is None else v
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in QUOTE_FIELDS}
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in QUOTE_FIELDS)
+
+    def __setstate__(self, state):
+        # states pickled before a field was added are shorter: the rest is None
+        state = tuple(state) + (None,) * (len(QUOTE_FIELDS) - len(state))
+        for name, v in zip(QUOTE_FIELDS, state):
+            setattr(self, name, v)
+
+    def __repr__(self):
+        return f"Quote({self.symbol} {self.price} {self.pct} src={self.source})"
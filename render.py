@@ -0,0 +1,230 @@
+# render.py - report layouts as precompiled templates; text / Telegram HTML / MarkdownV2 / CSV from one snapshot
+import io, re, csv, html
+from string import Formatter
+
+# formatted rows kept between ticks (a symbol whose values did not change is not re-formatted)
+ROW_CACHE_MAX = 50000
+
+class Report:
+    """Everything a report shows, computed once per run and shared by every
+    format / layout / chat variant rendered from it."""
+    def __init__(self, now, idx=None, market=None, trend=None, rows=(), up=0, down=0, total=0,
+                 movers=((), ()), delta=None, alerts=(), timing=None):
+        self.now = now
+        self.idx, self.market, self.trend = idx, market, trend or {}
+        self.rows = list(rows)            # [(symbol, Quote or None)] to list in the details
+        self.up, self.down, self.total = up, down, total
+        self.movers = movers              # ([(symbol, pct)] gainers, [(symbol, pct)] losers)
+        self.delta = delta                # (shown, total, since) in delta mode
+        self.alerts = list(alerts)
+        self.timing = timing
+        self._cells = None
+        self._out = {}                    # (fmt, layout) -> rendered text
+
+    def cells(self):
+        """Header / summary cell values (raw strings, format independent), built once."""
+        if self._cells is not None: return self._cells
+        idx, market, trend = self.idx or {}, self.market or {}, self.trend
+        fb, fs = market.get("foreign_buy"), market.get("foreign_sell")
+        parts = []
+        if trend.get("index_change_20d") is not None: parts.append(f"VN-Index {pct(trend['index_change_20d'])}")
+        if trend.get("foreign_net_20d") is not None: parts.append(f"Khối ngoại ròng {trend['foreign_net_20d']:+,.2f}")
+        if trend.get("breadth_20d") is not None: parts.append(f"Độ rộng TB {trend['breadth_20d']:.0%} mã tăng")
+        c = {
+            "now": self.now,
+            "index_price": f"{idx['price']:.2f}" if idx.get("price") is not None else "—",
+            "index_pct": pct(idx.get("pct")), "index_src": str(idx.get("source")),
+            "fbuy": "—" if fb is None else str(fb), "fsell": "—" if fs is None else str(fs),
+            "fnet": f" | Ròng: {fb - fs:+,.2f}" if fb is not None and fs is not None else "",
+            "market_src": str(market.get("source")),
+            "trend_days": str(trend.get("days", 0)), "trend_parts": " · ".join(parts) or "—",
+            "trend_5m": f" | NN 5 phút: {trend['foreign_5m']:+,.2f}" if trend.get("foreign_5m") else "",
+            "up": str(self.up), "down": str(self.down),
+            "movers_up": ", ".join(f"{s} {pct(p)}" for s, p in self.movers[0]),
+            "movers_down": ", ".join(f"{s} {pct(p)}" for s, p in self.movers[1]),
+            "dash": "—",
+        }
+        if self.delta:
+            c["shown"], c["total"], c["since"] = str(self.delta[0]), str(self.delta[1]), str(self.delta[2])
+        self._cells = c
+        return c
+
+# ---- cells --------------------------------------------------------------------------
+
+def pct(x):
+    return "—" if x is None else f"{x:+.2f}%"
+
+def shares_m(v):
+    return "—" if v is None else f"{v/1_000_000:,.2f} Mn"
+
+def _vol_ratio(q):
+    return q.vol / q.avg5_vol if q.vol and q.avg5_vol and q.avg5_vol > 0 else None
+
+# per-symbol cells by name; a template only evaluates the ones it uses
+ROW_CELLS = {
+    "price": lambda q: str(int(q.price)),
+    "price_n": lambda q: f"{q.price:,.0f}",
+    "pct": lambda q: pct(q.pct),
+    "vol": lambda q: shares_m(q.vol),
+    "vol_m": lambda q: "—" if q.vol is None else f"{q.vol/1_000_000:,.2f}",
+    "avg5_price": lambda q: str(q.avg5_price or "—"),
+    "avg5_vol": lambda q: shares_m(q.avg5_vol),
+    "vol_ratio": lambda q: f" (VolRatio={_vol_ratio(q):.2f}×)" if _vol_ratio(q) else "",
+    "vr": lambda q: f"{_vol_ratio(q):.2f}×" if _vol_ratio(q) else "—",
+    "rsi": lambda q: f" | RSI14={q.rsi14:.0f}" if q.rsi14 is not None else "",
+    "rsi_n": lambda q: f"{q.rsi14:.0f}" if q.rsi14 is not None else "—",
+}
+# Quote fields a row depends on (the row cache key)
+ROW_KEY_FIELDS = ("price", "pct", "vol", "avg5_vol", "avg5_price", "rsi14")
+
+# ---- templates ---------------------------------------------------------------------
+
+class Template:
+    """A "{field:spec}" line parsed once into literal / field pieces."""
+    def __init__(self, text):
+        self.text = text
+        self.parts = [(lit, field, spec or "") for lit, field, spec, _conv in Formatter().parse(text)]
+        self.fields = {f for _, f, _ in self.parts if f}
+
+    def render(self, cells, escape=None):
+        out = []
+        for lit, field, spec in self.parts:
+            out.append(lit)
+            if field is None: continue
+            v = cells[field]
+            # pad first: escape characters must not count toward the column width
+            if spec: v = format(v, spec)
+            out.append(escape(v) if escape else v)
+        return "".join(out)
+
+def md_escape(s):
+    return re.sub(r"([_*\[\]()~`>#+\-=|{}.!\\])", r"\\\1", s)
+
+_TEXT = {
+    "header": "📊 Báo cáo thị trường — {now}",
+    "index": "📈 VN-Index: {index_price} {index_pct} (src={index_src})",
+    "index_missing": "📈 VN-Index: — (lỗi dữ liệu)",
+    "foreign": "🌏 Khối ngoại: Mua {fbuy} / Bán {fsell}{fnet} (src={market_src})",
+    "trend": "📆 {trend_days} phiên: {trend_parts}{trend_5m}",
+    "delta": "🔄 Thay đổi: {shown}/{total} mã kể từ {since}",
+    "summary": "Summary: Tăng {up} / Giảm {down}",
+    "movers_up": "🚀 Top tăng: {movers_up}",
+    "movers_down": "📉 Top giảm: {movers_down}",
+    "details": "🔻 Chi tiết mã:",
+    "row": "{symbol}: {price} {pct} | KL={vol}{vol_ratio} | TB tuần: {avg5_price} / {avg5_vol}{rsi}",
+    "row_missing": "{symbol}: — (lỗi dữ liệu)",
+    "alerts": "⚠️ Alerts:",
+    "alert": "{alert}",
+    "footer": "(Thời gian báo cáo: {now}) - Bot_fixed",
+    "timing": "{timing}",
+}
+# Telegram HTML: one <code> line per symbol keeps the columns aligned and survives message splitting
+_HTML = dict(_TEXT, **{
+    "header": "📊 <b>Báo cáo thị trường</b> — {now}",
+    "index": "📈 <b>VN-Index</b>: {index_price} {index_pct} <i>({index_src})</i>",
+    "index_missing": "📈 <b>VN-Index</b>: — (lỗi dữ liệu)",
+    "foreign": "🌏 <b>Khối ngoại</b>: Mua {fbuy} / Bán {fsell}{fnet}",
+    "summary": "<b>Tăng {up} / Giảm {down}</b>",
+    "details": "🔻 <b>Chi tiết mã</b>\n<code>Mã          Giá        %   KL(Mn)  VolR  RSI</code>",
+    "row": "<code>{symbol:<6}{price_n:>9} {pct:>8} {vol_m:>8} {vr:>5} {rsi_n:>4}</code>",
+    "row_missing": "<code>{symbol:<6}{dash:>9}</code>",
+    "alerts": "⚠️ <b>Alerts</b>",
+    "footer": "<i>{now}</i>",
+    "timing": "<i>{timing}</i>",
+})
+_MARKDOWN = dict(_TEXT, **{
+    "header": "📊 *Báo cáo thị trường* — {now}",
+    "index": "📈 *VN\\-Index*: {index_price} {index_pct} _\\({index_src}\\)_",
+    "index_missing": "📈 *VN\\-Index*: — \\(lỗi dữ liệu\\)",
+    "foreign": "🌏 *Khối ngoại*: Mua {fbuy} / Bán {fsell}{fnet}",
+    "trend": "📆 {trend_days} phiên: {trend_parts}{trend_5m}",
+    "summary": "*Tăng {up} / Giảm {down}*",
+    "details": "🔻 *Chi tiết mã*\n`Mã          Giá        %   KL(Mn)  VolR  RSI`",
+    "row": "`{symbol:<6}{price_n:>9} {pct:>8} {vol_m:>8} {vr:>5} {rsi_n:>4}`",
+    "row_missing": "`{symbol:<6}{dash:>9}`",
+    "alerts": "⚠️ *Alerts*",
+    "footer": "_{now}_",
+    "timing": "_{timing}_",
+})
+
+# format -> (compiled templates, cell escape, Telegram parse_mode)
+FORMATS = {
+    "text": ({k: Template(v) for k, v in _TEXT.items()}, None, None),
+    "html": ({k: Template(v) for k, v in _HTML.items()}, html.escape, "HTML"),
+    "markdown": ({k: Template(v) for k, v in _MARKDOWN.items()}, md_escape, "MarkdownV2"),
+}
+# layout -> sections in order; a section without data renders nothing
+LAYOUTS = {
+    "full": ("header", "index", "foreign", "trend", "delta", "blank", "summary", "movers", "details",
+             "blank", "alerts", "blank", "footer", "timing"),
+    "brief": ("header", "index", "foreign", "trend", "delta", "blank", "summary", "movers", "blank", "alerts"),
+}
+
+_row_cache = {}
+
+def row(symbol, q, fmt="text"):
+    """One details line; cached on the Quote values it shows."""
+    tpls, escape, _ = FORMATS[fmt]
+    if q is None or q.price is None:
+        return tpls["row_missing"].render({"symbol": symbol, "dash": "—"}, escape)
+    key = (fmt, symbol) + tuple(getattr(q, f) for f in ROW_KEY_FIELDS)
+    line = _row_cache.get(key)
+    if line is None:
+        tpl = tpls["row"]
+        cells = {name: ROW_CELLS[name](q) for name in tpl.fields if name in ROW_CELLS}
+        cells["symbol"] = symbol
+        line = tpl.render(cells, escape)
+        if len(_row_cache) >= ROW_CACHE_MAX: _row_cache.clear()
+        _row_cache[key] = line
+    return line
+
+def _section(name, report, tpls, escape, fmt):
+    c = report.cells()
+    t = lambda key, cells=c: tpls[key].render(cells, escape)
+    if name == "blank": return [""]
+    if name == "header": return [t("header")]
+    if name == "index":
+        return [t("index")] if report.idx and report.idx.get("price") is not None else [t("index_missing")]
+    if name == "foreign":
+        m = report.market
+        return [t("foreign")] if m and (m.get("foreign_buy") is not None or m.get("foreign_sell") is not None) else []
+    if name == "trend": return [t("trend")] if report.trend.get("days", 0) >= 2 else []
+    if name == "delta": return [t("delta")] if report.delta else []
+    if name == "summary": return [t("summary")]
+    if name == "movers":
+        return ([t("movers_up")] if report.movers[0] else []) + ([t("movers_down")] if report.movers[1] else [])
+    if name == "details": return [t("details")] + [row(s, q, fmt) for s, q in report.rows]
+    if name == "alerts": return [t("alerts")] + [t("alert", {"alert": a}) for a in report.alerts]
+    if name == "footer": return [t("footer")]
+    if name == "timing": return [t("timing", {"timing": report.timing})] if report.timing else []
+    raise ValueError(f"unknown report section {name!r}")
+
+def render(report, fmt="text", layout="full"):
+    """The report as one string in fmt ("text", "html", "markdown" or "csv"),
+    rendered once per report and reused by every chat asking for the same variant."""
+    key = (fmt, layout)
+    if key in report._out: return report._out[key]
+    if fmt == "csv":
+        out = render_csv(report)
+    else:
+        tpls, escape, _ = FORMATS[fmt]
+        lines = []
+        for name in LAYOUTS[layout]:
+            lines.extend(_section(name, report, tpls, escape, fmt))
+        out = "\n".join(lines)
+    report._out[key] = out
+    return out
+
+def parse_mode(fmt):
+    return FORMATS[fmt][2] if fmt in FORMATS else None
+
+CSV_FIELDS = ("price", "pct", "vol", "avg5_price", "avg5_vol", "vol_ratio", "sma20", "sma50", "rsi14", "source")
+
+def render_csv(report):
+    """The details table with raw values (one row per listed symbol)."""
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    w.writerow(("symbol",) + CSV_FIELDS)
+    for s, q in report.rows:
+        w.writerow((s,) + tuple("" if q is None or getattr(q, f) is None else getattr(q, f) for f in CSV_FIELDS))
+    return buf.getvalue()
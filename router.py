@@ -0,0 +1,144 @@
+# router.py - latency/error-aware source selection with hedged backup requests
+import os, time, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# samples kept per source
+WINDOW = int(os.getenv("ROUTER_WINDOW", "50") or 50)
+# fire the backup source once the primary is slower than this percentile of its own latency
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90") or 90)
+# hedge delay (s) while a source has fewer than MIN_SAMPLES samples
+HEDGE_DEFAULT = float(os.getenv("HEDGE_DEFAULT", "8") or 8)
+HEDGE_MIN = 0.5
+MIN_SAMPLES = 5
+# a source above this error rate is only used when nothing healthy is left
+MAX_ERROR_RATE = 0.5
+
+class SourceStats:
+    """Rolling latency / error window of one source."""
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)   # (latency_s, ok)
+
+    def record(self, latency, ok):
+        self.samples.append((latency, bool(ok)))
+
+    def error_rate(self):
+        if not self.samples: return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def percentile(self, pct):
+        lat = sorted(l for l, ok in self.samples if ok)
+        if not lat: return None
+        return lat[min(len(lat) - 1, int(round(pct / 100 * (len(lat) - 1))))]
+
+    def healthy(self):
+        return len(self.samples) < MIN_SAMPLES or self.error_rate() <= MAX_ERROR_RATE
+
+    def score(self):
+        """Lower is better: median latency inflated by the error rate; inf
+        without a successful sample."""
+        p50 = self.percentile(50)
+        if p50 is None: return float("inf")
+        return p50 * (1 + 4 * self.error_rate())
+
+    def tier(self):
+        # 0 measured and answering, 1 not measured yet, 2 only failures so far
+        if not self.samples: return 1
+        return 0 if self.percentile(50) is not None else 2
+
+class Router:
+    def __init__(self, max_workers=8):
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="route")
+
+    def _stats_nolock(self, source):
+        st = self.stats.get(source)
+        if st is None:
+            st = self.stats[source] = SourceStats()
+        return st
+
+    def record(self, source, latency, ok):
+        with self.lock:
+            self._stats_nolock(source).record(latency, ok)
+
+    def rank(self, sources):
+        """Healthy sources by score, then unhealthy ones (last resort); ties keep the given order.
+        A source without samples ranks after the measured healthy ones: it gets
+        measured when it runs as a hedge, not by becoming primary on a guess."""
+        with self.lock:
+            keyed = []
+            for i, s in enumerate(sources):
+                st = self._stats_nolock(s)
+                keyed.append((not st.healthy(), st.tier(), st.score(), i, s))
+        return [s for *_k, s in sorted(keyed)]
+
+    def hedge_delay(self, source):
+        with self.lock:
+            st = self._stats_nolock(source)
+            p = st.percentile(HEDGE_PERCENTILE) if len(st.samples) >= MIN_SAMPLES else None
+        return max(HEDGE_MIN, p if p is not None else HEDGE_DEFAULT)
+
+    def _timed(self, source, fn, ok):
+        t0 = time.monotonic()
+        try:
+            res = fn()
+        except Exception:
+            self.record(source, time.monotonic() - t0, False)
+            raise
+        self.record(source, time.monotonic() - t0, ok(res))
+        return res
+
+    def call(self, candidates, ok=bool, timeout=30, log=print):
+        """Run the best candidate; if it has not answered within its hedge delay
+        (or fails) start the next one. The first result passing ok() wins.
+
+        candidates: {source: zero-arg callable}. Returns (source, result), or
+        (None, None) when every candidate failed or timeout passed.
+        """
+        order = self.rank(list(candidates))
+        end = time.monotonic() + timeout
+        running = {}
+        nxt = 0
+
+        def launch():
+            nonlocal nxt
+            src = order[nxt]; nxt += 1
+            running[self.pool.submit(self._timed, src, candidates[src], ok)] = src
+            return src
+
+        hedge_at = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= end: break
+            if nxt < len(order) and (now >= hedge_at or not running):
+                src = launch()
+                if len(running) > 1: log(f"router: hedging with {src}")
+                hedge_at = now + self.hedge_delay(src)
+                continue
+            if not running: break
+            wake = min(end, hedge_at) if nxt < len(order) else end
+            done, _ = wait(list(running), timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                src = running.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    log(f"router: {src} failed: {e}"); res = None
+                if ok(res):
+                    return src, res
+                # a bad answer: move on to the next source right away
+                hedge_at = time.monotonic()
+        return None, None
+
+    def snapshot(self):
+        with self.lock:
+            return {s: list(st.samples) for s, st in self.stats.items()}
+
+    def load(self, snap):
+        with self.lock:
+            for s, samples in (snap or {}).items():
+                st = self._stats_nolock(s)
+                st.samples.extend(tuple(x) for x in samples)
+
+ROUTER = Router()
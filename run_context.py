@@ -0,0 +1,66 @@
+# run_context.py - per-report memo of source calls + upstream request counter
+import threading
+from collections import Counter
+
+class RunContext:
+    """Lives for one build_report. Every source result is memoized under
+    (source, symbol, period) so any section of the report can read it again
+    without another upstream call; `requests` counts the calls that did go out.
+    """
+    def __init__(self):
+        self.memo = {}
+        self.requests = Counter()
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def has(self, source, symbol=None, period=None):
+        return (source, symbol, period) in self.memo
+
+    def get(self, source, symbol=None, period=None, default=None):
+        key = (source, symbol, period)
+        with self._lock:
+            if key in self.memo:
+                self.hits += 1
+                return self.memo[key]
+        return default
+
+    def put(self, source, symbol, period, value):
+        with self._lock:
+            self.memo[(source, symbol, period)] = value
+
+    def count_request(self, source, n=1):
+        with self._lock:
+            self.requests[source] += n
+
+    def fetch(self, source, symbol, period, fn, *args, **kwargs):
+        """Memoized fn(*args, **kwargs). Concurrent callers for the same key wait
+        for the first one instead of issuing their own call. A miss counts as
+        one upstream request for source."""
+        key = (source, symbol, period)
+        with self._lock:
+            if key in self.memo:
+                self.hits += 1
+                return self.memo[key]
+            ev = self._inflight.get(key)
+            owner = ev is None
+            if owner:
+                ev = self._inflight[key] = threading.Event()
+                self.requests[source] += 1
+        if not owner:
+            ev.wait()
+            return self.get(source, symbol, period)
+        value = None
+        try:
+            value = fn(*args, **kwargs)
+            return value
+        finally:
+            with self._lock:
+                self.memo[key] = value
+                self._inflight.pop(key, None)
+            ev.set()
+
+    def summary(self):
+        total = sum(self.requests.values())
+        per = " ".join(f"{k}={v}" for k, v in sorted(self.requests.items()))
+        return f"upstream requests: {total} ({per or 'none'}), memo hits: {self.hits}"
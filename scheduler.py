@@ -0,0 +1,66 @@
+# scheduler.py - HOSE session calendar and the tick loop used by `bot.py --daemon`
+import time
+from datetime import datetime, timedelta, time as dtime
+try:
+    from zoneinfo import ZoneInfo
+    VN_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+except Exception:
+    VN_TZ = None
+
+# continuous trading sessions (morning / afternoon, ATC included)
+SESSIONS = ((dtime(9, 0), dtime(11, 30)), (dtime(13, 0), dtime(15, 0)))
+
+def vn_now():
+    if VN_TZ is not None:
+        return datetime.now(VN_TZ)
+    # fallback: assume system tz is UTC and add 7 hours
+    return datetime.utcnow() + timedelta(hours=7)
+
+def in_session(now):
+    if now.weekday() >= 5: return False
+    t = now.time()
+    return any(start <= t <= end for start, end in SESSIONS)
+
+def next_session_start(now):
+    """First session start strictly after now (skips weekends)."""
+    day = now.replace(second=0, microsecond=0)
+    for _ in range(8):
+        if day.weekday() < 5:
+            for start, _end in SESSIONS:
+                at = day.replace(hour=start.hour, minute=start.minute)
+                if at > now: return at
+        day = (day + timedelta(days=1)).replace(hour=0, minute=0)
+    return now + timedelta(days=1)
+
+def next_tick(now, interval):
+    """Next wall-clock multiple of interval seconds (09:00, 09:05, ... for 300)."""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = (now - midnight).total_seconds()
+    return midnight + timedelta(seconds=(int(elapsed // interval) + 1) * interval)
+
+def run_forever(tick, interval=300, always=False, log=print):
+    """Call tick() on every interval boundary while the market is open.
+
+    Outside sessions the loop sleeps until the next session start. Each tick's
+    latency is logged; an exception in tick() is logged and the loop goes on.
+    """
+    ticks = 0
+    while True:
+        now = vn_now()
+        if always or in_session(now):
+            t0 = time.monotonic()
+            try:
+                tick()
+            except Exception as e:
+                log(f"tick error: {e}")
+            ticks += 1
+            log(f"tick #{ticks} latency {time.monotonic() - t0:.2f}s")
+            now = vn_now()
+            wake = next_tick(now, interval)
+            # the closing tick (15:00) is still inside the session, later ones are not
+            if not always and not in_session(wake):
+                wake = max(wake, next_session_start(now))
+        else:
+            wake = next_session_start(now)
+            log(f"market closed, sleeping until {wake.strftime('%Y-%m-%d %H:%M')}")
+        time.sleep(max(1.0, (wake - vn_now()).total_seconds()))
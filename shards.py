@@ -0,0 +1,95 @@
+# shards.py - split a whole-market watchlist across processes / runner instances and merge the quotes back
+import os, time, zlib, pickle, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from run_context import RunContext
+
+# where --shard i/N writes its part and --merge N reads them
+SHARD_DIR = os.getenv("SHARD_DIR", ".shards")
+# shard files older than this (s) are stale leftovers of an earlier run and ignored
+SHARD_MAX_AGE = float(os.getenv("SHARD_MAX_AGE", "600") or 600)
+
+def parse_shard(spec):
+    """"i/N" -> (i, N) with 0 <= i < N."""
+    i, _, n = spec.partition("/")
+    i, n = int(i), int(n)
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"bad shard {spec!r}, expected i/N with 0 <= i < N")
+    return i, n
+
+def shard_of(symbols, i, n):
+    """The symbols of shard i of n. crc32 of the symbol keeps every ticker on the
+    same shard (and its history files on the same runner) as the universe changes."""
+    if n <= 1: return list(symbols)
+    return [s for s in symbols if zlib.crc32(s.encode()) % n == i]
+
+def fetch_part(symbols):
+    """Worker: quotes for one shard. Returns ({symbol: Quote or None}, {source: requests})."""
+    import bot
+    ctx = RunContext()
+    bot.fetch_symbols(symbols, ctx)
+    return {s: ctx.get("symbol", s, bot.YF_PERIOD) for s in symbols}, dict(ctx.requests)
+
+def merge_into(ctx, part, period):
+    quotes, requests = part
+    for s, q in quotes.items():
+        ctx.put("symbol", s, period, q)
+    for src, n in requests.items():
+        ctx.count_request(src, n)
+
+_pool = None
+_pool_size = 0
+
+def _get_pool(processes):
+    # one pool per process so a resident daemon keeps its warm workers between ticks
+    global _pool, _pool_size
+    if _pool is None or _pool_size != processes:
+        if _pool is not None: _pool.shutdown()
+        # spawn, not fork: a forked child would inherit the parent's thread pools
+        # (fetch_engine, router) without their threads and hang on the first job
+        ctx = multiprocessing.get_context("spawn")
+        _pool, _pool_size = ProcessPoolExecutor(max_workers=processes, mp_context=ctx), processes
+    return _pool
+
+def fetch_parallel(symbols, processes, period, log=print):
+    """A RunContext holding the quotes of all symbols, fetched by `processes`
+    worker processes (one shard each). Index and market data are left to the
+    report, which fetches them once."""
+    ctx = RunContext()
+    parts = [shard_of(symbols, i, processes) for i in range(processes)]
+    pool = _get_pool(processes)
+    futs = [pool.submit(fetch_part, p) for p in parts if p]
+    for fut in futs:
+        try:
+            merge_into(ctx, fut.result(), period)
+        except Exception as e:
+            log(f"shard worker error: {e}")
+    return ctx
+
+def shard_path(i, n, root=None):
+    return os.path.join(root or SHARD_DIR, f"shard-{i}-of-{n}.pkl")
+
+def write_shard(symbols, i, n, root=None):
+    """--shard i/N: fetch this runner's part and leave it for the merge stage."""
+    part = fetch_part(shard_of(symbols, i, n))
+    path = shard_path(i, n, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"time": time.time(), "part": part}, f)
+    os.replace(tmp, path)
+    return path, len(part[0])
+
+def load_shards(n, period, root=None, log=print):
+    """--merge N: a RunContext with the quotes of every fresh shard file."""
+    ctx = RunContext()
+    for i in range(n):
+        path = shard_path(i, n, root)
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            log(f"shard {i}/{n} missing ({e}); the merge fetches its symbols"); continue
+        if time.time() - data["time"] > SHARD_MAX_AGE:
+            log(f"shard {i}/{n} is stale ({time.time() - data['time']:.0f}s old); the merge fetches its symbols"); continue
+        merge_into(ctx, data["part"], period)
+    return ctx
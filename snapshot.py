@@ -0,0 +1,97 @@
+# snapshot.py - intraday snapshot of the watchlist and vectorized deltas against the previous one
+import os, json
+try:
+    import numpy as np
+except Exception:
+    np = None
+import scheduler
+
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", ".snapshot.json")
+# a symbol is re-reported when its price moved at least this many % since it was last reported
+DELTA_PRICE_PCT = float(os.getenv("DELTA_PRICE_PCT", "0.5") or 0.5)
+# ... or its volume ratio moved by at least this much
+DELTA_VOLRATIO = float(os.getenv("DELTA_VOLRATIO", "0.3") or 0.3)
+
+def _col(quotes, name):
+    return np.array([getattr(q, name) if q is not None and getattr(q, name) is not None else np.nan for q in quotes], dtype=float)
+
+class Snapshot:
+    """Per-symbol price, volume ratio and alert state (bitmask of the alert rules
+    holding, from alerts.AlertEngine.active) as parallel arrays, plus the
+    Telegram message the delta report of the day lives in."""
+    def __init__(self, symbols, price, vol_ratio, alert, day=None, time=None, messages=None):
+        self.symbols = list(symbols)
+        self.price, self.vol_ratio, self.alert = price, vol_ratio, alert
+        self.day = day or scheduler.vn_now().strftime("%Y-%m-%d")
+        self.time = time or scheduler.vn_now().strftime("%H:%M")
+        self.messages = dict(messages or {})   # chat_id -> message_id
+
+    @classmethod
+    def take(cls, symbols, quote, alert=None):
+        """Snapshot of symbols; quote(symbol) returns its Quote or None, alert is
+        the alert state per symbol (none holding when not given)."""
+        qs = [quote(s) for s in symbols]
+        alert = np.zeros(len(symbols), np.int64) if alert is None else np.asarray(alert, np.int64)[:len(symbols)]
+        return cls(symbols, _col(qs, "price"), _col(qs, "vol_ratio"), alert)
+
+    def align(self, symbols):
+        """(price, vol_ratio, alert, known) of this snapshot in the order of symbols."""
+        pos = {s: i for i, s in enumerate(self.symbols)}
+        idx = np.array([pos.get(s, -1) for s in symbols], dtype=np.intp)
+        known = idx >= 0
+        if not len(self.symbols):
+            nan = np.full(len(symbols), np.nan)
+            return nan, nan.copy(), np.zeros(len(symbols), np.int64), known
+        idx = np.where(known, idx, 0)
+        return (np.where(known, self.price[idx], np.nan), np.where(known, self.vol_ratio[idx], np.nan),
+                np.where(known, self.alert[idx], 0).astype(np.int64), known)
+
+    def changes(self, cur):
+        """Boolean mask over cur.symbols: new symbols, data that appeared or
+        disappeared, price or volume-ratio moves beyond the thresholds, and
+        alert rules starting or stopping to hold."""
+        price, vr, alert, known = self.align(cur.symbols)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            moved = np.abs(cur.price / price - 1) * 100 >= DELTA_PRICE_PCT
+            vr_moved = np.abs(cur.vol_ratio - vr) >= DELTA_VOLRATIO
+        appeared = np.isnan(cur.price) != np.isnan(price)
+        return ~known | appeared | moved | vr_moved | (cur.alert != alert)
+
+    def advance(self, cur, changed):
+        """Next baseline: cur for the changed symbols, the last reported values
+        for the rest (so slow drifts still add up to a change)."""
+        price, vr, alert, _ = self.align(cur.symbols)
+        return Snapshot(cur.symbols, np.where(changed, cur.price, price), np.where(changed, cur.vol_ratio, vr),
+                        np.where(changed, cur.alert, alert).astype(np.int64), day=cur.day, time=cur.time,
+                        messages=self.messages if self.day == cur.day else None)
+
+    def to_json(self):
+        return {"day": self.day, "time": self.time, "symbols": self.symbols, "price": self.price.tolist(),
+                "vol_ratio": self.vol_ratio.tolist(), "alert": self.alert.tolist(), "messages": self.messages}
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d["symbols"], np.array(d["price"], dtype=float), np.array(d["vol_ratio"], dtype=float),
+                   np.array(d["alert"], dtype=np.int64), day=d.get("day"), time=d.get("time"), messages=d.get("messages"))
+
+_last = None
+
+def load(path=None):
+    """Previous snapshot: the one kept in memory (daemon), else the file; None if there is none."""
+    global _last
+    if _last is not None: return _last
+    try:
+        with open(path or SNAPSHOT_FILE, encoding="utf-8") as f:
+            _last = Snapshot.from_json(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+    return _last
+
+def save(snap, path=None):
+    global _last
+    _last = snap
+    path = path or SNAPSHOT_FILE
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snap.to_json(), f, ensure_ascii=False)
+    os.replace(tmp, path)
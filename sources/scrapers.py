@@ -0,0 +1,172 @@
+
+import re, codecs, html, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+try:
+    import cache
+except Exception:
+    cache = None
+try:
+    import metrics
+except Exception:
+    metrics = None
+import httpclient
+
+# None: the shared client's keep-alive pool per host (reused across ticks in daemon
+# mode); a session set here (e.g. the benchmark's fixtures) is used instead
+SESSION = None
+# one quick retry: the router already has another source to fall back on
+SCRAPE_RETRIES = 1
+
+# streaming parse: read in chunks and stop as soon as every field is found
+CHUNK_SIZE = 16 * 1024
+MAX_BYTES = 2 * 1024 * 1024
+# tail of already-scanned text kept so a match split across chunks is still found
+OVERLAP = 1024
+# ETag / Last-Modified + parsed result per URL, kept a day
+VALIDATOR_TTL = 24 * 3600
+
+_RE_NUMBER = re.compile(r"([0-9]+(?:\.[0-9]+)?)")
+_RE_TAG = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_RE_SPACE = re.compile(r"\s+")
+_RE_INDEX = re.compile(r"VN[- ]?Index[:\s]*([0-9\.,]+)", re.IGNORECASE)
+_RE_FOREIGN_VIETSTOCK = re.compile(r"(Khối ngoại|Nước ngoài|NN).{0,400}?Mua[:\s]*([0-9\.,]+).{0,400}?Bán[:\s]*([0-9\.,]+)", re.IGNORECASE)
+_RE_FOREIGN_CAFEF = re.compile(r"Khối ngoại.{0,400}?Mua[:\s]*([0-9\.,]+).{0,400}?Bán[:\s]*([0-9\.,]+)", re.IGNORECASE)
+
+VIETSTOCK_URLS = ["https://finance.vietstock.vn/ket-qua-giao-dich", "https://finance.vietstock.vn/"]
+CAFEF_URLS = ["https://cafef.vn/du-lieu.chn", "https://cafef.vn/du-lieu/lich-su-giao-dich-vnindex-1.chn"]
+
+def _parse_number(s):
+    if s is None: return None
+    s = str(s)
+    s = s.replace('\u202f','').replace('\xa0',' ').replace(',','').strip()
+    m = _RE_NUMBER.search(s.replace(' ',''))
+    if not m: return None
+    try:
+        return float(m.group(1))
+    except:
+        return None
+
+def html_to_text(raw):
+    """Cheap get_text(' ') replacement: drop tags/scripts, unescape, collapse spaces."""
+    return _RE_SPACE.sub(" ", html.unescape(_RE_TAG.sub(" ", raw)))
+
+def _validators(url):
+    return cache.CACHE.get(("http-validators", url)) if cache is not None else None
+
+def _remember(url, resp, result):
+    if cache is None: return
+    etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    if etag or modified:
+        cache.CACHE.set(("http-validators", url), (etag, modified, result), ttl=VALIDATOR_TTL)
+
+def stream_extract(url, extract, strip_tags=True, timeout=8, stop=None, source="scraper"):
+    """GET url and feed the decoded page to extract(text) chunk by chunk.
+
+    extract returns (result, complete); reading stops once complete, after
+    MAX_BYTES, or when the stop event is set. A 304 for a conditional GET
+    returns the result parsed last time (only stored when extract reported
+    complete or the whole page was read). Returns the result or None.
+    Concurrent calls for the same url and source share one download.
+    """
+    return httpclient.CLIENT.coalesce((httpclient.host_of(url), "scrape", url, source),
+                                      _stream_extract, url, extract, strip_tags, timeout, stop, source)
+
+def _stream_extract(url, extract, strip_tags, timeout, stop, source):
+    known = _validators(url)
+    headers = {}
+    if known:
+        if known[0]: headers["If-None-Match"] = known[0]
+        if known[1]: headers["If-Modified-Since"] = known[1]
+    with httpclient.CLIENT.request("GET", url, retries=SCRAPE_RETRIES, session=SESSION,
+                                   headers=headers, timeout=timeout, stream=True) as r:
+        if r.status_code == 304 and known:
+            return known[2]
+        if r.status_code != 200: return None
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+        buf, nbytes, result, complete = "", 0, None, False
+        for chunk in r.iter_content(CHUNK_SIZE):
+            nbytes += len(chunk)
+            buf += decoder.decode(chunk)
+            # only cut at a tag boundary so a tag is never half-stripped
+            cut = buf.rfind(">") + 1 if strip_tags else len(buf)
+            if cut > 0:
+                part = buf[:cut]
+                res, complete = extract(html_to_text(part) if strip_tags else part)
+                if res: result = res
+                if complete: break
+                buf = buf[max(0, cut - OVERLAP):]
+            if nbytes >= MAX_BYTES or (stop is not None and stop.is_set()): break
+        else:
+            # the whole page was read: what was found is all there is
+            complete = True
+        if metrics is not None: metrics.inc("bytes", source, nbytes)
+        # a download cut short (race lost, MAX_BYTES) parsed only part of the page,
+        # which must not be served for the full page's ETag on the next 304
+        if result and complete:
+            _remember(url, r, result)
+        return result
+
+def race(urls, fetch, timeout=8):
+    """Fetch every candidate URL concurrently; the first non-empty result wins
+    and the other downloads are told to stop."""
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="scrape")
+    pending = {pool.submit(fetch, u, timeout, stop) for u in urls}
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done: break
+            for f in done:
+                try: res = f.result()
+                except Exception: res = None
+                if res: return res
+    finally:
+        stop.set()
+        # losers finish on their own at the next chunk; do not wait for them
+        pool.shutdown(wait=False)
+    return None
+
+class _Fields:
+    """Accumulates index / foreign buy / sell across chunks."""
+    def __init__(self, foreign_re, buy_group):
+        self.foreign_re, self.buy_group = foreign_re, buy_group
+        self.idx = self.fb = self.fs = None
+
+    def __call__(self, text):
+        if self.idx is None:
+            m = _RE_INDEX.search(text)
+            if m: self.idx = _parse_number(m.group(1))
+        if self.fb is None and self.fs is None:
+            m = self.foreign_re.search(text)
+            if m:
+                self.fb = _parse_number(m.group(self.buy_group)); self.fs = _parse_number(m.group(self.buy_group + 1))
+        found = self.idx or self.fb or self.fs
+        return ((self.idx, self.fb, self.fs) if found else None), (self.idx is not None and self.fb is not None)
+
+def _vietstock_url(url, timeout=8, stop=None):
+    got = stream_extract(url, _Fields(_RE_FOREIGN_VIETSTOCK, 2), strip_tags=True, timeout=timeout, stop=stop, source="vietstock")
+    if not got: return None
+    idx, fb, fs = got
+    return {"source":"vietstock", "index": idx, "fbuy": fb, "fsell": fs, "ts": datetime.utcnow().isoformat()}
+
+def _cafef_url(url, timeout=8, stop=None):
+    # cafef has always been matched against the raw HTML
+    got = stream_extract(url, _Fields(_RE_FOREIGN_CAFEF, 1), strip_tags=False, timeout=timeout, stop=stop, source="cafef")
+    if not got: return None
+    idx, fb, fs = got
+    if not (idx or fb): return None
+    return {"source":"cafef", "index": idx, "fbuy": fb, "fsell": fs, "ts": datetime.utcnow().isoformat()}
+
+def scrape_vietstock_market(timeout=8):
+    try:
+        return race(VIETSTOCK_URLS, _vietstock_url, timeout)
+    except Exception:
+        return None
+
+def scrape_cafef_market(timeout=8):
+    try:
+        return race(CAFEF_URLS, _cafef_url, timeout)
+    except Exception:
+        return None
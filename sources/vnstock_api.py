@@ -0,0 +1,69 @@
+
+from datetime import datetime, timedelta
+
+try:
+    import lazy
+    vnstock = lazy.module("vnstock", "vnstock3")
+except Exception:
+    vnstock = None
+
+def load_vnstock():
+    """The vnstock (or vnstock3) module, imported on first call; None if neither is installed."""
+    return vnstock if vnstock else None
+
+def fetch_foreign(symbol=None):
+    try:
+        vns = load_vnstock()
+        if vns is None:
+            raise ImportError("vnstock/vnstock3 not installed")
+        # common patterns
+        if hasattr(vns, 'stock') and hasattr(vns.stock, 'foreign_trade'):
+            if symbol:
+                df = vns.stock.foreign_trade(symbol=symbol)
+            else:
+                df = vns.stock.foreign_trade()
+            if hasattr(df, 'iloc'):
+                row = df.iloc[-1].to_dict()
+            elif isinstance(df, dict):
+                row = df
+            else:
+                row = dict(df)
+            return {"source":"vnstock", "buy": row.get('buy') or row.get('buy_value') or row.get('buy_total'), "sell": row.get('sell') or row.get('sell_value') or row.get('sell_total')}
+        if hasattr(vns, 'foreign_trade'):
+            df = vns.foreign_trade() if not symbol else vns.foreign_trade(symbol)
+            if hasattr(df, 'iloc'):
+                row = df.iloc[-1].to_dict(); return {"source":"vnstock","buy":row.get('buy'),"sell":row.get('sell')}
+    except Exception as e:
+        return {"error": str(e), "source":"vnstock"}
+    return None
+
+# VCI quotes stock prices in thousand VND; yfinance (.VN) uses VND
+PRICE_SCALE = 1000
+
+def fetch_history(symbol, days=180):
+    """Daily OHLCV bars for symbol (or "VNINDEX") shaped like a yfinance frame:
+    DatetimeIndex + Open/High/Low/Close/Volume, prices in VND. None if vnstock
+    is missing or returned nothing."""
+    vns = load_vnstock()
+    if vns is None:
+        return None
+    import pandas as pd
+    end = datetime.now().date()
+    start = end - timedelta(days=int(days * 1.5) + 7)   # calendar days for `days` sessions
+    is_index = symbol.upper().endswith("INDEX")
+    scale = 1
+    if hasattr(vns, "Vnstock"):
+        df = vns.Vnstock().stock(symbol=symbol, source="VCI").quote.history(start=start.isoformat(), end=end.isoformat(), interval="1D")
+        scale = 1 if is_index else PRICE_SCALE
+    elif hasattr(vns, "stock_historical_data"):
+        df = vns.stock_historical_data(symbol=symbol, start_date=start.isoformat(), end_date=end.isoformat(), resolution="1D", type="index" if is_index else "stock")
+    else:
+        return None
+    if df is None or not hasattr(df, "empty") or df.empty:
+        return None
+    df = df.rename(columns={c: c.capitalize() for c in ("open", "high", "low", "close", "volume")})
+    df.index = pd.to_datetime(df["time"] if "time" in df.columns else df.index)
+    df.index.name = "Date"
+    df = df[["Open", "High", "Low", "Close", "Volume"]].astype(float)
+    df[["Open", "High", "Low", "Close"]] *= scale
+    return df.tail(days)